@@ -2,7 +2,7 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException
 from app.api import deps
 from app.api.v1 import models
-from app.core.generation import engine
+from app.core.generation import EngineDraining, engine
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -19,6 +19,8 @@ async def txt2img(
     try:
         response = await engine.generate_txt2img(request)
         return response
+    except EngineDraining as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.exception("Failed to generate image")
         raise HTTPException(status_code=500, detail=str(e))
@@ -35,6 +37,8 @@ async def img2img(
     try:
         response = await engine.generate_img2img(request)
         return response
+    except EngineDraining as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.exception("Failed to generate image")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,33 @@
+import os
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import FileResponse
+from app.core.config import settings
+from app.core.image_store import image_store
+
+router = APIRouter()
+
+
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+async def get_image(filename: str, if_none_match: str | None = Header(None)):
+    """Serves a stored image by content hash.
+
+    The digest doubles as a strong ETag; range requests and zero-copy sending
+    are handled by ``FileResponse``.
+    """
+    digest, _, extension = filename.partition(".")
+    if extension != "png" or not image_store.is_valid_digest(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    path = image_store.path_for(digest)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.IMAGE_STORE_TTL_SECONDS}, immutable",
+    }
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    ):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/png", headers=headers)
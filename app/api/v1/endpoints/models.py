@@ -18,17 +18,24 @@ async def get_models():
     return list(engine.model_registry.keys())
 
 
-@router.post("/load", status_code=status.HTTP_200_OK)
+@router.post("/load", status_code=status.HTTP_202_ACCEPTED)
 async def load_model(
     request: LoadModelRequest, current_user: dict = Depends(deps.get_current_user)
 ):
-    """Loads a model into memory."""
+    """Starts loading a model in the background and returns a status handle."""
     logger.info(
         f"Received request to load model {request.model_id} from user {current_user.get('name')}"
     )
-    try:
-        engine.load_model(request.model_id)
-        return {"message": f"Model {request.model_id} loaded successfully."}
-    except Exception as e:
-        logger.exception(f"Failed to load model {request.model_id}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    job = engine.request_model_load(request.model_id)
+    return job.to_dict()
+
+
+@router.get("/load/{load_id}")
+async def get_load_status(
+    load_id: str, current_user: dict = Depends(deps.get_current_user)
+):
+    """Returns the status of a background model load."""
+    job = engine.load_jobs.get(load_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown load {load_id}")
+    return job.to_dict()
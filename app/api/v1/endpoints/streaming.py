@@ -1,10 +1,15 @@
 import asyncio
+import functools
 import json
 import logging
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+import time
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from app.api import deps
 from app.api.v1.models import Txt2ImgRequest, Img2ImgRequest
-from app.core.generation import engine
+from app.core.config import settings
+from app.core.generation import EngineDraining, JobCancelled, engine
+from app.core.sessions import SessionJob, pack_frame, session_jobs
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -12,7 +17,7 @@ router = APIRouter()
 
 @router.websocket("/generate/txt2img")
 async def stream_txt2img(websocket: WebSocket, token: str | None = None):
-    await websocket.accept(subprotocols=["access_token", token or ""])
+    await websocket.accept()
     try:
         user = await deps.get_current_user(token)
         logger.info(f"WebSocket connection established for user {user.get('name')}")
@@ -42,4 +47,217 @@ async def stream_txt2img(websocket: WebSocket, token: str | None = None):
     except Exception as e:
         logger.exception("WebSocket error")
         if not websocket.client_state.value == 3:
-            await websocket.close(code=1011, reason=str(e))
\ No newline at end of file
+            await websocket.close(code=1011, reason=str(e))
+
+
+REQUEST_MODELS = {"txt2img": Txt2ImgRequest, "img2img": Img2ImgRequest}
+
+
+async def run_session_job(job: SessionJob, request: Txt2ImgRequest):
+    """Runs a session job to completion, independent of any socket."""
+
+    async def progress_callback(step: int, timestep: float, latents):
+        job.status = "running"
+        job.step = step + 1
+        job.notify("progress")
+
+    try:
+        response, png = await engine.generate(
+            request,
+            callback=progress_callback,
+            cancel=job.cancel_event,
+            raw_png=True,
+        )
+        job.response = response.dict()
+        job.png = png
+        job.finish("completed")
+        job.notify("result")
+    except JobCancelled:
+        job.finish("cancelled")
+        job.notify("cancelled")
+    except EngineDraining:
+        job.error = "Server is draining; resubmit to another instance."
+        job.finish("failed")
+        job.notify("error")
+    except Exception as e:
+        logger.exception(f"Session job {job.id} failed")
+        job.error = str(e)
+        job.finish("failed")
+        job.notify("error")
+    finally:
+        # Frees the result (and its PNG) even if nobody submits or resumes again.
+        session_jobs.schedule_purge()
+
+
+def finish_if_cancelled(job: SessionJob, task: asyncio.Task):
+    """Reports a session job whose task was cancelled, possibly before it ran."""
+    if task.cancelled() and not job.done:
+        job.finish("cancelled")
+        job.notify("cancelled")
+        session_jobs.schedule_purge()
+
+
+@router.websocket("/session")
+async def generation_session(websocket: WebSocket, token: str | None = None):
+    """Long-lived socket multiplexing many txt2img/img2img jobs.
+
+    Authentication happens once per connection. Results are sent as binary
+    frames (see ``pack_frame``) carrying the PNG, or as text frames when the
+    request asked for ``response_format="url"``.
+    """
+    await websocket.accept()
+    try:
+        user = await deps.get_current_user(token)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    owner = user.get("name")
+    logger.info(f"WebSocket session opened for user {owner}")
+
+    outbox: asyncio.Queue = asyncio.Queue()
+    attached: dict[str, SessionJob] = {}
+    last_seen = time.monotonic()
+
+    def send(header: dict, payload: bytes | None = None):
+        outbox.put_nowait((header, payload))
+
+    def deliver(job: SessionJob, header: dict, payload: bytes | None):
+        send(header, payload)
+
+    def attach(job: SessionJob):
+        job.listener = deliver
+        attached[job.id] = job
+
+    def find_job(message: dict) -> SessionJob | None:
+        job_id = message.get("job_id")
+        if job_id:
+            return attached.get(job_id) if isinstance(job_id, str) else None
+        client_id = message.get("client_id")
+        for job in attached.values():
+            if client_id is not None and job.client_id == client_id:
+                return job
+        return None
+
+    def submit(message: dict):
+        client_id = message.get("client_id")
+        kind = message.get("kind", "txt2img")
+        if kind not in REQUEST_MODELS:
+            send({"type": "error", "client_id": client_id, "message": "Unknown kind."})
+            return
+        if session_jobs.unfinished(owner) >= settings.SESSION_MAX_JOBS:
+            message = f"At most {settings.SESSION_MAX_JOBS} jobs may run per user."
+            send({"type": "error", "client_id": client_id, "message": message})
+            return
+        request_data = message.get("request", {})
+        if not isinstance(request_data, dict):
+            send({"type": "error", "client_id": client_id, "message": "Bad request."})
+            return
+        try:
+            request = REQUEST_MODELS[kind](**request_data)
+        except (ValidationError, TypeError) as e:
+            send({"type": "error", "client_id": client_id, "message": str(e)})
+            return
+        job = SessionJob(owner, client_id, kind, request.num_inference_steps)
+        session_jobs.add(job)
+        attach(job)
+        send({"type": "accepted", "job_id": job.id, "client_id": client_id})
+        logger.info(f"Session job {job.id} ({job.kind}) submitted by {owner}")
+        job.task = asyncio.create_task(run_session_job(job, request))
+        job.task.add_done_callback(functools.partial(finish_if_cancelled, job))
+
+    def resume(message: dict):
+        job_ids = message.get("job_ids", [])
+        if not isinstance(job_ids, list):
+            send({"type": "error", "message": "job_ids must be a list."})
+            return
+        for job_id in job_ids:
+            job = session_jobs.get(owner, job_id) if isinstance(job_id, str) else None
+            if job is None:
+                send({"type": "error", "job_id": job_id, "message": "Unknown job."})
+                continue
+            attach(job)
+            header, payload = job.final_message()
+            send(header, payload)
+
+    async def reader():
+        nonlocal last_seen
+        while True:
+            data = await websocket.receive_text()
+            last_seen = time.monotonic()
+            try:
+                message = json.loads(data)
+            except json.JSONDecodeError:
+                message = None
+            if not isinstance(message, dict):
+                send({"type": "error", "message": "Messages must be JSON objects."})
+                continue
+            message_type = message.get("type")
+            if message_type == "submit":
+                submit(message)
+            elif message_type == "cancel":
+                job = find_job(message)
+                if job is None:
+                    send(
+                        {
+                            "type": "error",
+                            "job_id": message.get("job_id"),
+                            "client_id": message.get("client_id"),
+                            "message": "Unknown job.",
+                        }
+                    )
+                elif not job.done:
+                    # Observed by the job at its next denoising step.
+                    job.cancel_event.set()
+                    if job.status == "queued":
+                        # Not denoising yet: stop waiting for a stage slot.
+                        job.task.cancel()
+            elif message_type == "resume":
+                resume(message)
+            elif message_type == "ping":
+                send({"type": "pong", "ts": message.get("ts")})
+            elif message_type != "pong":
+                error = f"Unknown message type {message_type!r}."
+                send({"type": "error", "message": error})
+
+    async def writer():
+        while True:
+            header, payload = await outbox.get()
+            if payload is None:
+                await websocket.send_text(json.dumps(header, separators=(",", ":")))
+            else:
+                await websocket.send_bytes(pack_frame(header, payload))
+
+    async def heartbeat():
+        interval = settings.SESSION_HEARTBEAT_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - last_seen > 3 * interval:
+                logger.info(f"WebSocket session for {owner} timed out")
+                return
+            send({"type": "ping", "ts": time.time()})
+
+    send({"type": "ready", "user": owner, "max_jobs": settings.SESSION_MAX_JOBS})
+    tasks = [
+        asyncio.create_task(reader()),
+        asyncio.create_task(writer()),
+        asyncio.create_task(heartbeat()),
+    ]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.error(f"WebSocket session error: {error!r}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Jobs keep running; a later connection can resume them by id.
+        for job in attached.values():
+            if job.listener is deliver:
+                job.listener = None
+        if websocket.client_state.value != 3:
+            try:
+                await websocket.close(code=1000)
+            except RuntimeError:
+                pass
+        logger.info(f"WebSocket session closed for user {owner}")
@@ -1,5 +1,18 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
+
+
+class FeatureCacheOptions(BaseModel):
+    interval: int = Field(
+        3,
+        ge=1,
+        le=10,
+        description="Recompute deep UNet features every N steps and reuse them in between.",
+    )
+    start_step: int = Field(0, ge=0, description="First step where features are reused.")
+    end_step: Optional[int] = Field(
+        None, ge=1, description="Step after which every step is computed in full."
+    )
 
 
 class Txt2ImgRequest(BaseModel):
@@ -24,6 +37,17 @@ class Txt2ImgRequest(BaseModel):
     lora_scale: Optional[float] = Field(
         0.8, ge=0.0, le=2.0, description="Scale for LoRA weights."
     )
+    performance_profile: Optional[Literal["quality", "balanced", "fast"]] = Field(
+        None, description="Named speed/quality trade-off; defaults to the server's."
+    )
+    feature_cache: Optional[FeatureCacheOptions] = Field(
+        None,
+        description="DeepCache-style UNet feature reuse; overrides the profile's setting.",
+    )
+    response_format: Literal["b64", "url"] = Field(
+        "b64",
+        description="Return the image inline as base64 or as a URL into the image store.",
+    )
 
 
 class Img2ImgRequest(Txt2ImgRequest):
@@ -34,8 +58,11 @@ class Img2ImgRequest(Txt2ImgRequest):
 
 
 class GenerationResponse(BaseModel):
-    image_b64: str
+    image_b64: Optional[str] = None
+    image_url: Optional[str] = None
     seed: int
     model_id: str
+    backend: Optional[str] = None
     generation_time: float
-    nsfw_content_detected: bool
\ No newline at end of file
+    nsfw_content_detected: bool
+    stage_timings: Optional[dict[str, float]] = None
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""Inference backends selectable per model in ``GenerationEngine.model_registry``.
+
+Backends are imported lazily so that, for example, the fake backend works
+without torch and the CPU backends are only needed when a model uses them.
+"""
+
+import importlib
+import importlib.util
+from app.core.backends.base import InferenceBackend, LoadReport, StepCallback
+
+BACKENDS = {
+    "diffusers": "app.core.backends.diffusers_torch:DiffusersTorchBackend",
+    "onnxruntime": "app.core.backends.optimum_cpu:OnnxRuntimeBackend",
+    "openvino": "app.core.backends.optimum_cpu:OpenVINOBackend",
+    "fake": "app.core.backends.fake:FakeBackend",
+}
+
+# Packages a backend needs beyond requirements.txt (see requirements-cpu.txt).
+OPTIONAL_DEPENDENCIES = {
+    "onnxruntime": "optimum.onnxruntime",
+    "openvino": "optimum.intel",
+}
+
+
+def backend_available(name: str) -> bool:
+    """Whether ``name`` is a known backend whose optional packages are installed."""
+    if name not in BACKENDS:
+        return False
+    module_name = OPTIONAL_DEPENDENCIES.get(name)
+    if module_name is None:
+        return True
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def create_backend(name: str, model_id: str) -> InferenceBackend:
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend {name}; expected one of {', '.join(BACKENDS)}."
+        )
+    module_name, class_name = BACKENDS[name].split(":")
+    backend_cls = getattr(importlib.import_module(module_name), class_name)
+    return backend_cls(model_id)
+
+
+__all__ = [
+    "BACKENDS",
+    "InferenceBackend",
+    "LoadReport",
+    "StepCallback",
+    "backend_available",
+    "create_backend",
+]
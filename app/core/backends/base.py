@@ -0,0 +1,82 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional, TypedDict
+from PIL import Image
+
+# Called from the inference thread after every denoising step.
+StepCallback = Callable[[int, float], None]
+
+
+class LoadReport(TypedDict):
+    model_id: str
+    source: str
+    dtype: str
+    total_time: float
+    mapped_bytes: int
+    components: dict[str, float]
+
+
+class InferenceBackend(ABC):
+    """Runs txt2img/img2img for one model on one kind of runtime.
+
+    Generation parameters are passed as a dict with the keys of the request
+    models (``prompt``, ``negative_prompt``, ``num_inference_steps``,
+    ``guidance_scale``, ``seed``, ``lora_scale`` plus ``width``/``height`` for
+    txt2img or ``image``/``strength`` for img2img). Backends that set
+    ``supports_feature_cache`` may also receive ``feature_cache`` with the
+    fields of ``FeatureCacheOptions``. All methods are blocking and are called
+    from an executor thread.
+    """
+
+    name: str = ""
+    supports_lora: bool = False
+    supports_feature_cache: bool = False
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+
+    @abstractmethod
+    def load(self) -> LoadReport: ...
+
+    def warmup(self):
+        """Runs a minimal generation so the first request does not pay for it."""
+
+    @abstractmethod
+    def txt2img(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Image.Image: ...
+
+    @abstractmethod
+    def img2img(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Image.Image: ...
+
+    def txt2img_latents(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Any:
+        """Denoising half of ``txt2img``; the result is passed to ``decode``.
+
+        Backends that cannot split their pipeline run it in full here.
+        """
+        return self.txt2img(params, on_step)
+
+    def img2img_latents(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Any:
+        return self.img2img(params, on_step)
+
+    def decode(self, latents: Any) -> tuple[Image.Image, bool]:
+        """Turns denoised latents into an image plus an NSFW flag."""
+        return latents, False
+
+    def load_lora(self, lora_path: str):
+        raise NotImplementedError(f"The {self.name} backend does not support LoRAs.")
+
+    def unload_loras(self):
+        raise NotImplementedError(f"The {self.name} backend does not support LoRAs.")
+
+    def release(self):
+        """Drops references to model weights so their memory can be reclaimed."""
+
+    def peak_memory_mb(self) -> Optional[float]:
+        """Peak accelerator memory allocated by this process, if known."""
+        return None
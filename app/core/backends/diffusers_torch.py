@@ -0,0 +1,176 @@
+import contextlib
+import copy
+import gc
+from typing import Any, Optional
+import torch
+from diffusers import AutoPipelineForImage2Image
+from PIL import Image
+from app.core import snapshots
+from app.core.backends.base import InferenceBackend, LoadReport, StepCallback
+from app.core.feature_cache import UNetFeatureCache
+
+
+def step_callback_kwargs(on_step: Optional[StepCallback]) -> dict[str, Any]:
+    """Adapts ``on_step`` to diffusers' ``callback_on_step_end`` protocol."""
+    if on_step is None:
+        return {}
+
+    def callback_on_step_end(pipe, step, timestep, callback_kwargs):
+        on_step(step, float(timestep))
+        return callback_kwargs
+
+    return {"callback_on_step_end": callback_on_step_end}
+
+
+class DiffusersTorchBackend(InferenceBackend):
+    """Diffusers pipelines on PyTorch, fp16 on CUDA and fp32 on CPU."""
+
+    name = "diffusers"
+    supports_lora = True
+    supports_feature_cache = True
+
+    def __init__(self, model_id: str):
+        super().__init__(model_id)
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.dtype = torch.float16 if self.device == "cuda" else torch.float32
+        self.txt2img_pipe = None
+        self.img2img_pipe = None
+        self.feature_cache: Optional[UNetFeatureCache] = None
+        self.decode_vae = None
+        self.decode_stream = None
+
+    def load(self) -> LoadReport:
+        self.txt2img_pipe, load_report = snapshots.load_pipeline(
+            self.model_id, self.dtype, self.device
+        )
+        self.img2img_pipe = AutoPipelineForImage2Image.from_pipe(self.txt2img_pipe)
+        unet = getattr(self.txt2img_pipe, "unet", None)
+        if unet is not None and UNetFeatureCache.supports(unet):
+            self.feature_cache = UNetFeatureCache(unet)
+        vae = self.txt2img_pipe.vae
+        if vae.dtype == torch.float16 and getattr(vae.config, "force_upcast", False):
+            # Decoding runs next to the following job's denoising, so give it
+            # its own fp32 copy instead of upcasting the shared VAE in place.
+            self.decode_vae = copy.deepcopy(vae).to(torch.float32)
+        else:
+            self.decode_vae = vae
+        if self.device == "cuda":
+            self.decode_stream = torch.cuda.Stream()
+        return load_report
+
+    def warmup(self):
+        self.txt2img_pipe(prompt="", num_inference_steps=1, output_type="latent")
+
+    def _accelerated(self, params: dict[str, Any]):
+        options = params.get("feature_cache")
+        if not options or options["interval"] <= 1 or self.feature_cache is None:
+            return contextlib.nullcontext()
+        return self.feature_cache.enabled(
+            options["interval"], options["start_step"], options["end_step"]
+        )
+
+    def _pipeline_kwargs(
+        self, params: dict[str, Any], on_step: Optional[StepCallback]
+    ) -> dict[str, Any]:
+        kwargs = dict(params)
+        kwargs.pop("feature_cache", None)
+        seed = kwargs.pop("seed")
+        kwargs["generator"] = torch.Generator(device=self.device).manual_seed(seed)
+        lora_scale = kwargs.pop("lora_scale", None)
+        if lora_scale is not None:
+            kwargs["cross_attention_kwargs"] = {"scale": lora_scale}
+        kwargs.update(step_callback_kwargs(on_step))
+        return kwargs
+
+    def txt2img(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Image.Image:
+        with self._accelerated(params):
+            return self.txt2img_pipe(**self._pipeline_kwargs(params, on_step)).images[0]
+
+    def img2img(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Image.Image:
+        with self._accelerated(params):
+            return self.img2img_pipe(**self._pipeline_kwargs(params, on_step)).images[0]
+
+    def _handoff(self, latents: torch.Tensor) -> Any:
+        if self.device != "cuda":
+            return latents, None
+        ready = torch.cuda.Event()
+        ready.record()
+        return latents, ready
+
+    def txt2img_latents(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Any:
+        kwargs = self._pipeline_kwargs(params, on_step)
+        with self._accelerated(params):
+            latents = self.txt2img_pipe(**kwargs, output_type="latent").images
+        return self._handoff(latents)
+
+    def img2img_latents(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Any:
+        kwargs = self._pipeline_kwargs(params, on_step)
+        with self._accelerated(params):
+            latents = self.img2img_pipe(**kwargs, output_type="latent").images
+        return self._handoff(latents)
+
+    def _decode(self, latents: torch.Tensor) -> tuple[Image.Image, bool]:
+        # Mirrors the tail of the Stable Diffusion (XL) pipelines' __call__.
+        pipe = self.txt2img_pipe
+        vae = self.decode_vae
+        latents = latents.to(vae.dtype)
+        latents_mean = getattr(vae.config, "latents_mean", None)
+        latents_std = getattr(vae.config, "latents_std", None)
+        if latents_mean is not None and latents_std is not None:
+            mean = torch.tensor(latents_mean).view(1, -1, 1, 1).to(latents)
+            std = torch.tensor(latents_std).view(1, -1, 1, 1).to(latents)
+            latents = latents * std / vae.config.scaling_factor + mean
+        else:
+            latents = latents / vae.config.scaling_factor
+        image = vae.decode(latents, return_dict=False)[0]
+        has_nsfw = None
+        if getattr(pipe, "safety_checker", None) is not None:
+            image, has_nsfw = pipe.run_safety_checker(image, self.device, self.dtype)
+        if getattr(pipe, "watermark", None) is not None:
+            # SDXL watermarks the decoded tensor, before post-processing.
+            image = pipe.watermark.apply_watermark(image)
+        do_denormalize = None if has_nsfw is None else [not nsfw for nsfw in has_nsfw]
+        image = pipe.image_processor.postprocess(
+            image, output_type="pil", do_denormalize=do_denormalize
+        )
+        return image[0], bool(has_nsfw and has_nsfw[0])
+
+    @torch.no_grad()
+    def decode(self, latents: Any) -> tuple[Image.Image, bool]:
+        latents, ready = latents
+        if self.decode_stream is None:
+            return self._decode(latents)
+        # Decode on a side stream so it can overlap the next job's denoising.
+        with torch.cuda.stream(self.decode_stream):
+            self.decode_stream.wait_event(ready)
+            latents.record_stream(self.decode_stream)
+            return self._decode(latents)
+
+    def load_lora(self, lora_path: str):
+        self.txt2img_pipe.load_lora_weights(lora_path)
+
+    def unload_loras(self):
+        self.txt2img_pipe.unload_lora_weights()
+
+    def release(self):
+        self.txt2img_pipe = None
+        self.img2img_pipe = None
+        self.feature_cache = None
+        self.decode_vae = None
+        self.decode_stream = None
+        gc.collect()
+        if self.device == "cuda":
+            torch.cuda.empty_cache()
+
+    def peak_memory_mb(self) -> Optional[float]:
+        if self.device != "cuda":
+            return None
+        return torch.cuda.max_memory_allocated() / 1024**2
@@ -0,0 +1,90 @@
+import hashlib
+import random
+import time
+from typing import Any, Optional
+from PIL import Image
+from app.core.backends.base import InferenceBackend, LoadReport, StepCallback
+from app.core.config import settings
+
+
+class FakeBackend(InferenceBackend):
+    """Deterministic, dependency-free backend for tests and API benchmarks.
+
+    The output is a gradient whose colours are derived from the prompt and
+    seed, so identical requests produce identical PNGs. Each step sleeps
+    ``FAKE_BACKEND_STEP_SECONDS`` to simulate inference latency.
+    """
+
+    name = "fake"
+    supports_lora = True
+
+    def __init__(self, model_id: str):
+        super().__init__(model_id)
+        self.loras: list[str] = []
+
+    def load(self) -> LoadReport:
+        return {
+            "model_id": self.model_id,
+            "source": "fake",
+            "dtype": "uint8",
+            "total_time": 0.0,
+            "mapped_bytes": 0,
+            "components": {},
+        }
+
+    def _render(
+        self, params: dict[str, Any], size: tuple[int, int], loras: list[str]
+    ) -> Image.Image:
+        key = "|".join(
+            str(params.get(name))
+            for name in ("prompt", "negative_prompt", "seed", "guidance_scale")
+        )
+        key += "|" + "|".join(loras)
+        rng = random.Random(hashlib.sha256(key.encode("utf-8")).digest())
+        start = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+        end = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+        mask = Image.linear_gradient("L").rotate(rng.randrange(360)).resize(size)
+        return Image.composite(start, end, mask)
+
+    def _denoise(self, params: dict[str, Any], on_step: Optional[StepCallback]):
+        steps = params["num_inference_steps"]
+        for step in range(steps):
+            if settings.FAKE_BACKEND_STEP_SECONDS:
+                time.sleep(settings.FAKE_BACKEND_STEP_SECONDS)
+            if on_step is not None:
+                on_step(step, float(steps - step))
+
+    def txt2img_latents(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Any:
+        self._denoise(params, on_step)
+        return params, (params["width"], params["height"]), None, list(self.loras)
+
+    def img2img_latents(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Any:
+        self._denoise(params, on_step)
+        return params, params["image"].size, params["image"], list(self.loras)
+
+    def decode(self, latents: Any) -> tuple[Image.Image, bool]:
+        params, size, init_image, loras = latents
+        image = self._render(params, size, loras)
+        if init_image is not None:
+            image = Image.blend(init_image, image, params["strength"])
+        return image, False
+
+    def txt2img(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Image.Image:
+        return self.decode(self.txt2img_latents(params, on_step))[0]
+
+    def img2img(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Image.Image:
+        return self.decode(self.img2img_latents(params, on_step))[0]
+
+    def load_lora(self, lora_path: str):
+        self.loras.append(lora_path)
+
+    def unload_loras(self):
+        self.loras = []
@@ -0,0 +1,210 @@
+"""CPU backends running exported UNet, VAE and text-encoder graphs.
+
+Both backends use Hugging Face Optimum: the first load exports the diffusers
+checkpoint once to ``settings.EXPORT_DIR`` and later loads read the exported
+graphs directly. ``optimum[onnxruntime]`` or ``optimum-intel[openvino]`` must
+be installed for the respective backend (see ``requirements-cpu.txt``).
+"""
+
+import os
+import time
+from abc import abstractmethod
+from typing import Any, Optional
+import torch
+from PIL import Image
+from app.core.backends.base import InferenceBackend, LoadReport, StepCallback
+from app.core.backends.diffusers_torch import step_callback_kwargs
+from app.core.config import settings
+
+# Graph-backed parts of an Optimum pipeline and the plain objects next to them.
+PIPELINE_PARTS = (
+    "unet",
+    "transformer",
+    "vae_encoder",
+    "vae_decoder",
+    "text_encoder",
+    "text_encoder_2",
+    "text_encoder_3",
+)
+PIPELINE_SUBMODELS = (
+    "scheduler",
+    "tokenizer",
+    "tokenizer_2",
+    "tokenizer_3",
+    "feature_extractor",
+)
+
+
+class _OptimumBackend(InferenceBackend):
+    def __init__(self, model_id: str):
+        super().__init__(model_id)
+        self.export_dir = os.path.join(
+            settings.EXPORT_DIR, self.name, model_id.replace("/", "--")
+        )
+        self.txt2img_pipe = None
+        self.img2img_pipe = None
+
+    @abstractmethod
+    def _pipeline_classes(self) -> tuple[type, type]:
+        """The (txt2img, img2img) Optimum pipeline classes."""
+
+    @abstractmethod
+    def _from_pretrained(self, cls: type, path: str, export: bool): ...
+
+    @abstractmethod
+    def _pipelines_mapping(self, task_cls: type) -> dict[str, type]:
+        """Model type to concrete pipeline class for an ``*PipelineFor*`` class."""
+
+    @abstractmethod
+    def _shared_graphs(self, pipe) -> dict[str, Any]:
+        """Constructor arguments that reuse ``pipe``'s loaded graphs."""
+
+    def _img2img_pipeline(self, txt2img_cls: type, img2img_cls: type):
+        """Builds the img2img pipeline on the graphs of the txt2img one."""
+        pipe = self.txt2img_pipe
+        model_type = next(
+            (
+                name
+                for name, cls in self._pipelines_mapping(txt2img_cls).items()
+                if type(pipe) is cls
+            ),
+            None,
+        )
+        pipeline_cls = self._pipelines_mapping(img2img_cls).get(model_type)
+        if pipeline_cls is None:
+            return self._from_pretrained(img2img_cls, self.export_dir, export=False)
+        kwargs = {
+            name: getattr(pipe, name)
+            for name in PIPELINE_SUBMODELS
+            if getattr(pipe, name, None) is not None
+        }
+        for flag in ("force_zeros_for_empty_prompt", "requires_aesthetics_score"):
+            if flag in pipe.config:
+                kwargs[flag] = pipe.config[flag]
+        return pipeline_cls(**kwargs, **self._shared_graphs(pipe))
+
+    def load(self) -> LoadReport:
+        txt2img_cls, img2img_cls = self._pipeline_classes()
+        start_time = time.time()
+        timings = {}
+        if os.path.isfile(os.path.join(self.export_dir, "model_index.json")):
+            source = "export"
+            self.txt2img_pipe = self._from_pretrained(
+                txt2img_cls, self.export_dir, export=False
+            )
+            timings["load_graphs"] = time.time() - start_time
+        else:
+            source = "hub"
+            self.txt2img_pipe = self._from_pretrained(
+                txt2img_cls, self.model_id, export=True
+            )
+            timings["export"] = time.time() - start_time
+            step_start = time.time()
+            self.txt2img_pipe.save_pretrained(self.export_dir)
+            timings["save_export"] = time.time() - step_start
+        step_start = time.time()
+        self.img2img_pipe = self._img2img_pipeline(txt2img_cls, img2img_cls)
+        timings["img2img"] = time.time() - step_start
+        return {
+            "model_id": self.model_id,
+            "source": source,
+            "dtype": "float32",
+            "total_time": time.time() - start_time,
+            "mapped_bytes": 0,
+            "components": timings,
+        }
+
+    def warmup(self):
+        self.txt2img_pipe(prompt="", num_inference_steps=1, output_type="latent")
+
+    def _pipeline_kwargs(
+        self, params: dict[str, Any], on_step: Optional[StepCallback]
+    ) -> dict[str, Any]:
+        kwargs = dict(params)
+        kwargs["generator"] = torch.Generator().manual_seed(kwargs.pop("seed"))
+        kwargs.pop("lora_scale", None)
+        kwargs.update(step_callback_kwargs(on_step))
+        return kwargs
+
+    def txt2img(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Image.Image:
+        return self.txt2img_pipe(**self._pipeline_kwargs(params, on_step)).images[0]
+
+    def img2img(
+        self, params: dict[str, Any], on_step: Optional[StepCallback] = None
+    ) -> Image.Image:
+        return self.img2img_pipe(**self._pipeline_kwargs(params, on_step)).images[0]
+
+    def release(self):
+        self.txt2img_pipe = None
+        self.img2img_pipe = None
+
+
+class OnnxRuntimeBackend(_OptimumBackend):
+    name = "onnxruntime"
+
+    def _pipeline_classes(self) -> tuple[type, type]:
+        from optimum.onnxruntime import (
+            ORTPipelineForImage2Image,
+            ORTPipelineForText2Image,
+        )
+
+        return ORTPipelineForText2Image, ORTPipelineForImage2Image
+
+    def _from_pretrained(self, cls: type, path: str, export: bool):
+        return cls.from_pretrained(
+            path,
+            export=export,
+            provider="CPUExecutionProvider",
+            cache_dir=settings.MODEL_CACHE_DIR,
+        )
+
+    def _pipelines_mapping(self, task_cls: type) -> dict[str, type]:
+        return task_cls.ort_pipelines_mapping
+
+    def _shared_graphs(self, pipe) -> dict[str, Any]:
+        # The InferenceSessions are shared, so the graphs are held once.
+        sessions = {
+            f"{part}_session": getattr(pipe, part).session
+            for part in PIPELINE_PARTS
+            if getattr(pipe, part, None) is not None
+        }
+        return {
+            **sessions,
+            "use_io_binding": pipe.use_io_binding,
+            "model_save_dir": pipe.model_save_dir,
+        }
+
+
+class OpenVINOBackend(_OptimumBackend):
+    name = "openvino"
+
+    def _pipeline_classes(self) -> tuple[type, type]:
+        from optimum.intel import OVPipelineForImage2Image, OVPipelineForText2Image
+
+        return OVPipelineForText2Image, OVPipelineForImage2Image
+
+    def _from_pretrained(self, cls: type, path: str, export: bool):
+        return cls.from_pretrained(
+            path, export=export, device="CPU", cache_dir=settings.MODEL_CACHE_DIR
+        )
+
+    def _pipelines_mapping(self, task_cls: type) -> dict[str, type]:
+        return task_cls.ov_pipelines_mapping
+
+    def _shared_graphs(self, pipe) -> dict[str, Any]:
+        # The openvino.Model graphs are shared; each pipeline compiles its own
+        # requests on first use.
+        models = {
+            part: getattr(pipe, part).model
+            for part in PIPELINE_PARTS
+            if getattr(pipe, part, None) is not None
+        }
+        return {
+            **models,
+            "device": "CPU",
+            "ov_config": pipe.ov_config,
+            "dynamic_shapes": pipe.is_dynamic,
+            "model_save_dir": pipe.model_save_dir,
+        }
@@ -13,6 +13,29 @@ class Settings(BaseSettings):
     TORCH_HOME: str = os.getenv("TORCH_HOME", "/root/.cache/torch")
     MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", "/models")
     LOG_DIR: str = os.getenv("LOG_DIR", "/logs")
+    DEFAULT_BACKEND: str = "diffusers"
+    EXPORT_DIR: str = os.getenv(
+        "EXPORT_DIR", os.path.join(os.getenv("MODEL_CACHE_DIR", "/models"), "exports")
+    )
+    FAKE_BACKEND_STEP_SECONDS: float = 0.0
+    DEFAULT_PERFORMANCE_PROFILE: str = "quality"
+    # Denoise workers share one pipeline and its scheduler, so keep this at 1.
+    MAX_CONCURRENT_JOBS: int = 1
+    PIPELINE_QUEUE_SIZE: int = 2
+    ENCODE_WORKERS: int = 2
+    DRAIN_TIMEOUT_SECONDS: float = 300.0
+    SESSION_MAX_JOBS: int = 8
+    SESSION_HEARTBEAT_SECONDS: float = 15.0
+    SESSION_RESUME_TTL_SECONDS: int = 5 * 60
+    USE_MODEL_SNAPSHOTS: bool = True
+    SNAPSHOT_DIR: str = os.getenv(
+        "SNAPSHOT_DIR",
+        os.path.join(os.getenv("MODEL_CACHE_DIR", "/models"), "snapshots"),
+    )
+    IMAGE_STORE_DIR: str = os.getenv("IMAGE_STORE_DIR", "/images")
+    IMAGE_STORE_MAX_BYTES: int = 2 * 1024**3
+    IMAGE_STORE_TTL_SECONDS: int = 24 * 60 * 60
+    IMAGE_STORE_GC_INTERVAL_SECONDS: int = 5 * 60
 
     class Config:
         case_sensitive = True
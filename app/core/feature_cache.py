@@ -0,0 +1,104 @@
+"""DeepCache-style reuse of deep UNet features across denoising steps.
+
+Adjacent denoising steps produce very similar high-level features, so only
+the shallow path (``conv_in``, the first down block, the last up block and
+``conv_out``) has to be recomputed every step. While a ``UNetFeatureCache`` is
+enabled, every ``interval``-th UNet call inside ``[start_step, end_step)`` runs
+in full and records the outputs of the deeper blocks; the calls in between
+return those recorded outputs instead of running the blocks. Steps outside the
+range always run in full.
+"""
+
+import contextlib
+import logging
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UNetFeatureCache:
+    def __init__(self, unet):
+        self.unet = unet
+        self.blocks = [
+            block
+            for block in (
+                *unet.down_blocks[1:],
+                unet.mid_block,
+                *unet.up_blocks[:-1],
+            )
+            if block is not None
+        ]
+        self.outputs: dict[int, Any] = {}
+        self.step = 0
+        self.reused_steps = 0
+        self._reuse = False
+        self._lock = threading.Lock()
+        self._owner: Optional[int] = None
+
+    @staticmethod
+    def supports(unet) -> bool:
+        return (
+            len(getattr(unet, "down_blocks", ())) > 1
+            and len(getattr(unet, "up_blocks", ())) > 1
+        )
+
+    def _wrap(self, index: int, forward):
+        def cached_forward(*args, **kwargs):
+            # Other threads may share the UNet without acceleration.
+            if self._owner != threading.get_ident():
+                return forward(*args, **kwargs)
+            if self._reuse:
+                return self.outputs[index]
+            output = forward(*args, **kwargs)
+            self.outputs[index] = output
+            return output
+
+        return cached_forward
+
+    @contextlib.contextmanager
+    def enabled(
+        self, interval: int, start_step: int = 0, end_step: Optional[int] = None
+    ):
+        """Accelerates UNet calls made by the current thread within the block."""
+        with self._lock:
+            self.outputs = {}
+            self.step = 0
+            self.reused_steps = 0
+            self._owner = threading.get_ident()
+
+            def before_unet_call(module, args):
+                if self._owner != threading.get_ident():
+                    return
+                in_range = self.step >= start_step and (
+                    end_step is None or self.step < end_step
+                )
+                self._reuse = (
+                    in_range
+                    and bool(self.outputs)
+                    and (self.step - start_step) % interval != 0
+                )
+                self.reused_steps += self._reuse
+                self.step += 1
+
+            originals = []
+            for index, block in enumerate(self.blocks):
+                originals.append(block.__dict__.get("forward"))
+                block.forward = self._wrap(index, block.forward)
+            hook = self.unet.register_forward_pre_hook(before_unet_call)
+            try:
+                yield self
+            finally:
+                hook.remove()
+                for block, original in zip(self.blocks, originals):
+                    if original is None:
+                        del block.forward
+                    else:
+                        block.forward = original
+                self.outputs = {}
+                self._reuse = False
+                self._owner = None
+                logger.info(
+                    f"Feature cache reused deep UNet features on {self.reused_steps} "
+                    f"of {self.step} steps (interval={interval})."
+                )
@@ -1,197 +1,583 @@
 import base64
+import contextlib
 import io
 import logging
+import os
+import random
+import sys
+import threading
 import time
+import uuid
 from typing import Optional, TypedDict, Callable, Any
-import torch
-from diffusers import AutoPipelineForImage2Image, AutoPipelineForText2Image
 from PIL import Image
-from app.api.v1.models import GenerationResponse, Img2ImgRequest, Txt2ImgRequest
+from app.api.v1.models import (
+    FeatureCacheOptions,
+    GenerationResponse,
+    Img2ImgRequest,
+    Txt2ImgRequest,
+)
+from app.core.backends import (
+    InferenceBackend,
+    LoadReport,
+    backend_available,
+    create_backend,
+)
 from app.core.config import settings
+from app.core.image_store import image_store
+from app.core.stages import Stage
 import asyncio
 
 logger = logging.getLogger(__name__)
 
 
 class PipelineResult(TypedDict):
-    image_b64: str
+    image_b64: Optional[str]
+    image_url: Optional[str]
+    image_png: Optional[bytes]
     generation_time: float
     nsfw_content_detected: bool
+    stage_timings: dict[str, float]
+
+
+class EngineDraining(RuntimeError):
+    """Raised when a job is submitted while the engine is draining."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job whose cancel event was set."""
+
+
+class ModelSpec(TypedDict):
+    repo_id: str
+    backend: str
+
+
+class ModelSlot:
+    """A loaded model plus the jobs currently running on it."""
+
+    def __init__(
+        self, spec: ModelSpec, backend: InferenceBackend, load_report: LoadReport
+    ):
+        self.spec = spec
+        self.backend = backend
+        self.load_report = load_report
+        self.loaded_loras: dict[str, str] = {}
+        self.in_flight = 0
+        self.retired = False
+
+
+class ModelLoadJob:
+    """Status handle for a background model load."""
+
+    def __init__(self, spec: ModelSpec):
+        self.id = uuid.uuid4().hex
+        self.spec = spec
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.load_report: Optional[LoadReport] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("ready", "failed")
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "load_id": self.id,
+            "model_id": self.spec["repo_id"],
+            "backend": self.spec["backend"],
+            "status": self.status,
+            "error": self.error,
+            "load_report": self.load_report,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
 
 
 class GenerationEngine:
+    MAX_TRACKED_LOAD_JOBS = 32
+
     def __init__(self):
-        self.txt2img_pipe = None
-        self.img2img_pipe = None
-        self.current_model_id: Optional[str] = None
+        self.active: Optional[ModelSlot] = None
+        model_registry: dict[str, ModelSpec] = {
+            "sd-xl-base": {
+                "repo_id": "stabilityai/stable-diffusion-xl-base-1.0",
+                "backend": "diffusers",
+            },
+            "sd-2-1": {
+                "repo_id": "stabilityai/stable-diffusion-2-1",
+                "backend": "diffusers",
+            },
+            "sd-1-5": {
+                "repo_id": "runwayml/stable-diffusion-v1-5",
+                "backend": "diffusers",
+            },
+            "sd-1-5-onnx": {
+                "repo_id": "runwayml/stable-diffusion-v1-5",
+                "backend": "onnxruntime",
+            },
+            "sd-1-5-openvino": {
+                "repo_id": "runwayml/stable-diffusion-v1-5",
+                "backend": "openvino",
+            },
+        }
+        # Only list models whose backend can actually run in this image.
         self.model_registry = {
-            "sd-xl-base": "stabilityai/stable-diffusion-xl-base-1.0",
-            "sd-2-1": "stabilityai/stable-diffusion-2-1",
-            "sd-1-5": "runwayml/stable-diffusion-v1-5",
+            model_id: spec
+            for model_id, spec in model_registry.items()
+            if backend_available(spec["backend"])
         }
-        self.loaded_loras: dict[str, str] = {}
+        for model_id in model_registry.keys() - self.model_registry.keys():
+            backend = model_registry[model_id]["backend"]
+            logger.info(f"Not registering {model_id}: {backend} is not installed.")
+        self.performance_profiles: dict[str, Optional[FeatureCacheOptions]] = {
+            "quality": None,
+            "balanced": FeatureCacheOptions(interval=3),
+            "fast": FeatureCacheOptions(interval=5),
+        }
+        self.load_jobs: dict[str, ModelLoadJob] = {}
+        self._load_lock: Optional[asyncio.Lock] = None
+        self.retired_slots: list[ModelSlot] = []
+        self.draining = False
+        self.admitted_jobs = 0
+        self.avg_job_seconds: Optional[float] = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.denoise_stage = Stage("denoise", settings.MAX_CONCURRENT_JOBS, 0)
+        self.decode_stage = Stage("decode", 1, settings.PIPELINE_QUEUE_SIZE)
+        self.encode_stage = Stage(
+            "encode", settings.ENCODE_WORKERS, settings.PIPELINE_QUEUE_SIZE
+        )
+        self.stages = [self.denoise_stage, self.decode_stage, self.encode_stage]
+
+    def resolve_model(self, model_id: str) -> ModelSpec:
+        return self.model_registry.get(
+            model_id, {"repo_id": model_id, "backend": settings.DEFAULT_BACKEND}
+        )
+
+    def _build_slot(
+        self, spec: ModelSpec, job: Optional[ModelLoadJob] = None
+    ) -> ModelSlot:
+        logger.info(f"Loading model {spec['repo_id']} on backend {spec['backend']}")
+        backend = create_backend(spec["backend"], spec["repo_id"])
+        load_report = backend.load()
+        if job is not None:
+            job.status = "warming"
+        warmup_start = time.time()
+        backend.warmup()
+        load_report["components"]["warmup"] = time.time() - warmup_start
+        logger.info(
+            f"Model {spec['repo_id']} loaded successfully from {load_report['source']} "
+            f"in {load_report['total_time']:.2f}s.",
+            extra={"load_report": load_report},
+        )
+        return ModelSlot(spec, backend, load_report)
+
+    def _swap(self, slot: ModelSlot):
+        previous, self.active = self.active, slot
+        logger.info(f"Now serving model {slot.spec['repo_id']}.")
+        if previous is not None:
+            previous.retired = True
+            if previous.in_flight == 0:
+                self._release(previous)
+            else:
+                self.retired_slots.append(previous)
+
+    def _release(self, slot: ModelSlot):
+        logger.info(f"Releasing model {slot.spec['repo_id']}.")
+        slot.backend.release()
+        if slot in self.retired_slots:
+            self.retired_slots.remove(slot)
 
     def load_model(self, model_id: str):
-        resolved_model_id = self.model_registry.get(model_id, model_id)
-        if (
-            resolved_model_id == self.current_model_id
-            and self.txt2img_pipe
-            and self.img2img_pipe
-        ):
-            logger.info(f"Model {resolved_model_id} is already loaded.")
+        """Loads a model synchronously; used at startup before serving."""
+        spec = self.resolve_model(model_id)
+        if self.active is not None and self.active.spec == spec:
+            logger.info(f"Model {spec['repo_id']} is already loaded.")
             return
-        logger.info(f"Loading model: {resolved_model_id}")
-        self.txt2img_pipe = AutoPipelineForText2Image.from_pretrained(
-            resolved_model_id,
-            torch_dtype=torch.float16,
-            variant="fp16",
-            cache_dir=settings.MODEL_CACHE_DIR,
-        ).to("cuda")
-        self.img2img_pipe = AutoPipelineForImage2Image.from_pipe(self.txt2img_pipe).to(
-            "cuda"
-        )
-        self.current_model_id = resolved_model_id
-        self.loaded_loras = {}
-        logger.info(f"Model {resolved_model_id} loaded successfully.")
+        self._swap(self._build_slot(spec))
+
+    def request_model_load(self, model_id: str) -> ModelLoadJob:
+        """Starts loading a model in the background and returns its handle.
+
+        The current model keeps serving until the new one is warm; the swap is
+        a single reference assignment on the event loop, and the old backend is
+        released once its in-flight jobs have finished.
+        """
+        spec = self.resolve_model(model_id)
+        for job in self.load_jobs.values():
+            if job.spec == spec and not job.done:
+                return job
+        job = ModelLoadJob(spec)
+        if self.active is not None and self.active.spec == spec:
+            job.status = "ready"
+            job.load_report = self.active.load_report
+            job.finished_at = job.created_at
+        else:
+            job.task = asyncio.create_task(self._load_in_background(job))
+        self.load_jobs[job.id] = job
+        finished = [j for j in self.load_jobs.values() if j.done]
+        excess = max(0, len(self.load_jobs) - self.MAX_TRACKED_LOAD_JOBS)
+        for stale in finished[:excess]:
+            del self.load_jobs[stale.id]
+        return job
+
+    async def _load_in_background(self, job: ModelLoadJob):
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        # One load at a time: every resident model costs a full copy of weights.
+        async with self._load_lock:
+            try:
+                if self.active is not None and self.active.spec == job.spec:
+                    job.load_report = self.active.load_report
+                else:
+                    job.status = "loading"
+                    loop = asyncio.get_event_loop()
+                    slot = await loop.run_in_executor(
+                        None, self._build_slot, job.spec, job
+                    )
+                    job.load_report = slot.load_report
+                    self._swap(slot)
+                job.status = "ready"
+            except Exception as e:
+                logger.exception(f"Failed to load model {job.spec['repo_id']}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+
+    @contextlib.asynccontextmanager
+    async def _use_model(self, model_id: str):
+        spec = self.resolve_model(model_id)
+        while self.active is None or self.active.spec != spec:
+            job = self.request_model_load(model_id)
+            if job.task is not None:
+                await asyncio.shield(job.task)
+            if job.status == "failed":
+                raise RuntimeError(f"Failed to load model {model_id}: {job.error}")
+        slot = self.active
+        slot.in_flight += 1
+        try:
+            yield slot
+        finally:
+            slot.in_flight -= 1
+            if slot.retired and slot.in_flight == 0:
+                self._release(slot)
+
+    @contextlib.asynccontextmanager
+    async def _admit(self):
+        """Tracks a job from submission to completion, refusing it when draining."""
+        if self.draining:
+            raise EngineDraining("Server is draining and not accepting new jobs.")
+        self._idle.clear()
+        self.admitted_jobs += 1
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start_time
+            self.avg_job_seconds = (
+                elapsed
+                if self.avg_job_seconds is None
+                else 0.8 * self.avg_job_seconds + 0.2 * elapsed
+            )
+            self.admitted_jobs -= 1
+            if self.admitted_jobs == 0:
+                self._idle.set()
+
+    async def drain(self, timeout: float | None = None) -> bool:
+        """Stops admitting jobs and waits for admitted ones to finish.
+
+        Returns ``False`` if jobs were still running when ``timeout`` expired.
+        """
+        self.draining = True
+        logger.info(f"Draining: waiting for {self.admitted_jobs} admitted jobs.")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain timed out with {self.admitted_jobs} jobs left.")
+            return False
 
-    async def load_lora(self, lora_path: str):
-        if not self.txt2img_pipe:
+    def _memory_headroom(self) -> dict[str, Optional[float]]:
+        headroom: dict[str, Optional[float]] = {
+            "ram_available_mb": None,
+            "gpu_free_mb": None,
+            "gpu_total_mb": None,
+        }
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        headroom["ram_available_mb"] = int(line.split()[1]) / 1024
+                        break
+        except OSError:
+            pages = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+            headroom["ram_available_mb"] = pages / 1024**2
+        # Only query CUDA if a backend has already imported torch.
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            free, total = torch.cuda.mem_get_info()
+            headroom["gpu_free_mb"] = free / 1024**2
+            headroom["gpu_total_mb"] = total / 1024**2
+        return headroom
+
+    def capacity(self) -> dict[str, Any]:
+        """Cheap load snapshot for load balancers; safe to poll every second."""
+        # The denoise stage is the bottleneck: a new job starts once one of its
+        # workers frees up, whatever is still decoding or encoding.
+        denoise = self.denoise_stage
+        backlog = denoise.waiting + denoise.holding
+        estimated_wait = 0.0
+        if denoise.avg_seconds is not None and backlog >= denoise.workers:
+            estimated_wait = (
+                (backlog - denoise.workers + 1) * denoise.avg_seconds / denoise.workers
+            )
+        resident = [self.active] if self.active is not None else []
+        return {
+            "draining": self.draining,
+            "queue_depth": denoise.waiting,
+            "active_jobs": self.admitted_jobs - denoise.waiting,
+            "max_concurrent_jobs": denoise.workers,
+            "avg_job_seconds": self.avg_job_seconds,
+            "estimated_wait_seconds": estimated_wait,
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+            "models": [
+                {
+                    "model_id": slot.spec["repo_id"],
+                    "backend": slot.spec["backend"],
+                    "serving": not slot.retired,
+                    "in_flight": slot.in_flight,
+                    "loras": list(slot.loaded_loras),
+                }
+                for slot in resident + self.retired_slots
+            ],
+            "loading": [
+                job.spec["repo_id"] for job in self.load_jobs.values() if not job.done
+            ],
+            "memory": self._memory_headroom(),
+        }
+
+    async def load_lora(self, lora_path: str, slot: Optional[ModelSlot] = None):
+        slot = slot or self.active
+        if slot is None:
             raise RuntimeError("Cannot load LoRA: no base model is loaded.")
+        if not slot.backend.supports_lora:
+            raise ValueError(f"The {slot.backend.name} backend does not support LoRAs.")
         logger.info(f"Loading LoRA: {lora_path}")
         loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None, lambda: self.txt2img_pipe.load_lora_weights(lora_path)
-        )
-        self.loaded_loras[lora_path] = lora_path
+        await loop.run_in_executor(None, slot.backend.load_lora, lora_path)
+        slot.loaded_loras[lora_path] = lora_path
         logger.info(f"LoRA {lora_path} loaded successfully.")
 
-    def unload_lora(self, lora_path: str):
-        if not self.txt2img_pipe:
+    async def unload_lora(self, lora_path: str):
+        slot = self.active
+        if slot is None:
             raise RuntimeError("Cannot unload LoRA: no base model is loaded.")
-        if lora_path not in self.loaded_loras:
+        if lora_path not in slot.loaded_loras:
             raise ValueError(f"LoRA {lora_path} is not currently loaded.")
         logger.info(f"Unloading LoRA: {lora_path}")
-        self.txt2img_pipe.unload_lora_weights()
-        del self.loaded_loras[lora_path]
-        if self.loaded_loras:
-            for path in self.loaded_loras:
-                self.txt2img_pipe.load_lora_weights(path)
+        del slot.loaded_loras[lora_path]
+
+        def reload_remaining():
+            slot.backend.unload_loras()
+            for path in slot.loaded_loras:
+                slot.backend.load_lora(path)
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, reload_remaining)
         logger.info(f"LoRA {lora_path} unloaded successfully.")
 
     def get_loaded_loras(self) -> list[str]:
-        return list(self.loaded_loras.keys())
+        if self.active is None:
+            return []
+        return list(self.active.loaded_loras.keys())
+
+    def _resolve_feature_cache(
+        self, request: Txt2ImgRequest
+    ) -> Optional[FeatureCacheOptions]:
+        if request.feature_cache is not None:
+            return request.feature_cache
+        profile = request.performance_profile or settings.DEFAULT_PERFORMANCE_PROFILE
+        return self.performance_profiles.get(profile)
 
-    def _get_generator(self, seed: int) -> torch.Generator:
+    def _resolve_seed(self, seed: int) -> int:
         if seed == -1:
-            seed = torch.randint(0, 2**32 - 1, (1,)).item()
-        return torch.Generator(device="cuda").manual_seed(seed)
+            return random.randint(0, 2**32 - 1)
+        return seed
+
+    def _encode_image(self, image: Image.Image, response_format: str) -> dict:
+        buffered = io.BytesIO()
+        image.save(buffered, format="PNG")
+        encoded = {"image_b64": None, "image_url": None, "image_png": None}
+        if response_format == "url":
+            digest = image_store.put(buffered.getvalue())
+            encoded["image_url"] = image_store.url_for(digest)
+        elif response_format == "png":
+            # Raw bytes for callers with their own framing (WebSocket sessions).
+            encoded["image_png"] = buffered.getvalue()
+        else:
+            encoded["image_b64"] = base64.b64encode(buffered.getvalue()).decode("utf-8")
+        return encoded
 
     async def _run_pipeline(
-        self, pipeline, callback: Callable | None = None, **kwargs
+        self,
+        slot: ModelSlot,
+        task: str,
+        params: dict[str, Any],
+        callback: Callable | None = None,
+        response_format: str = "b64",
+        cancel: Optional[threading.Event] = None,
     ) -> PipelineResult:
-        prompt = kwargs.get("prompt", "")
-        lora_scale = kwargs.pop("lora_scale", None)
+        """Runs a job through the denoise, decode and encode stages.
+
+        A job only gives up its slot in a stage once the next stage has room,
+        so the denoise stage can take the next job while this one is decoded
+        or encoded, without results piling up between stages.
+        """
+        backend = slot.backend
         start_time = time.time()
-        torch.cuda.reset_peak_memory_stats()
+        loop = asyncio.get_event_loop()
+        on_step = None
+        if callback or cancel:
+
+            def on_step(step: int, timestep: float):
+                # Runs on the inference thread; raising aborts the backend run,
+                # progress is handed to the event loop without waiting for it.
+                if cancel is not None and cancel.is_set():
+                    raise JobCancelled()
+                if callback:
+                    asyncio.run_coroutine_threadsafe(
+                        callback(step, timestep, None), loop
+                    )
+
+        denoise = (
+            backend.txt2img_latents if task == "txt2img" else backend.img2img_latents
+        )
+        stage_timings = {}
         try:
-            pipeline_kwargs = kwargs.copy()
-            if lora_scale is not None:
-                pipeline_kwargs["cross_attention_kwargs"] = {"scale": lora_scale}
-            if callback:
-
-                async def callback_wrapper(step, timestep, latents):
-                    await callback(step, timestep, latents)
-
-                pipeline_kwargs["callback_on_step_end"] = callback_wrapper
-                pipeline_kwargs["callback_on_step_end_tensor_inputs"] = ["latents"]
-            logger.info(f'Starting generation for prompt: "{prompt[:80]}..."')
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, lambda: pipeline(**pipeline_kwargs).images[0]
-            )
+            await self.denoise_stage.acquire()
+            try:
+                if cancel is not None and cancel.is_set():
+                    raise JobCancelled()
+                stage_timings["queued"] = time.time() - start_time
+                logger.info(
+                    f'Starting generation for prompt: "{params["prompt"][:80]}..."'
+                )
+                stage_start = time.time()
+                latents = await self.denoise_stage.execute(denoise, params, on_step)
+                stage_timings["denoise"] = time.time() - stage_start
+                await self.decode_stage.acquire()
+            finally:
+                self.denoise_stage.release()
+            try:
+                stage_start = time.time()
+                image, nsfw_content_detected = await self.decode_stage.execute(
+                    backend.decode, latents
+                )
+                stage_timings["decode"] = time.time() - stage_start
+                await self.encode_stage.acquire()
+            finally:
+                self.decode_stage.release()
+            try:
+                stage_start = time.time()
+                encoded = await self.encode_stage.execute(
+                    self._encode_image, image, response_format
+                )
+                stage_timings["encode"] = time.time() - stage_start
+            finally:
+                self.encode_stage.release()
             generation_time = time.time() - start_time
-            vram_peak = torch.cuda.max_memory_allocated() / 1024**2
+            # Stages of different jobs overlap, so only the process-wide peak
+            # is meaningful, not a per-job one.
+            memory_peak = backend.peak_memory_mb()
             logger.info(
-                f"Generation finished in {generation_time:.2f}s. Peak VRAM used: {vram_peak:.2f} MB."
+                f"Generation finished in {generation_time:.2f}s on {backend.name}. "
+                f"Process peak memory: "
+                f"{'n/a' if memory_peak is None else f'{memory_peak:.2f} MB'}.",
+                extra={"stage_timings": stage_timings},
             )
-            nsfw_content_detected = False
-            buffered = io.BytesIO()
-            result.save(buffered, format="PNG")
-            image_b64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
             return {
-                "image_b64": image_b64,
+                **encoded,
                 "generation_time": generation_time,
                 "nsfw_content_detected": nsfw_content_detected,
+                "stage_timings": stage_timings,
             }
+        except JobCancelled:
+            logger.info("Generation cancelled.")
+            raise
         except Exception as e:
             logger.exception("Error during pipeline execution")
             raise e
 
-    async def generate_txt2img(
-        self, request: Txt2ImgRequest, callback: Callable | None = None
-    ) -> GenerationResponse:
-        self.load_model(request.model_id)
-        if request.lora_path and request.lora_path not in self.loaded_loras:
-            await self.load_lora(request.lora_path)
-        generator = self._get_generator(request.seed)
-        actual_seed = generator.seed()
-        pipeline_args = {
-            "prompt": request.prompt,
-            "negative_prompt": request.negative_prompt,
-            "num_inference_steps": request.num_inference_steps,
-            "guidance_scale": request.guidance_scale,
-            "width": request.width,
-            "height": request.height,
-            "generator": generator,
-            "lora_scale": request.lora_scale,
-        }
-        if self.txt2img_pipe is not None:
+    async def generate(
+        self,
+        request: Txt2ImgRequest,
+        callback: Callable | None = None,
+        cancel: Optional[threading.Event] = None,
+        raw_png: bool = False,
+    ) -> tuple[GenerationResponse, Optional[bytes]]:
+        """Runs a txt2img or img2img request.
+
+        Setting ``cancel`` aborts the job at its next denoising step. With
+        ``raw_png`` the image is returned as PNG bytes next to the response
+        instead of inside it, unless the request asks for a URL.
+        """
+        if isinstance(request, Img2ImgRequest):
+            task = "img2img"
+            init_image_bytes = base64.b64decode(request.image_b64)
+            init_image = Image.open(io.BytesIO(init_image_bytes)).convert("RGB")
+            params = {"image": init_image, "strength": request.strength}
+        else:
+            task = "txt2img"
+            params = {"width": request.width, "height": request.height}
+        response_format = request.response_format
+        if raw_png and response_format != "url":
+            response_format = "png"
+        async with self._admit(), self._use_model(request.model_id) as slot:
+            if request.lora_path and request.lora_path not in slot.loaded_loras:
+                await self.load_lora(request.lora_path, slot)
+            actual_seed = self._resolve_seed(request.seed)
+            params = {
+                "prompt": request.prompt,
+                "negative_prompt": request.negative_prompt,
+                "num_inference_steps": request.num_inference_steps,
+                "guidance_scale": request.guidance_scale,
+                "seed": actual_seed,
+                "lora_scale": request.lora_scale,
+                **params,
+            }
+            feature_cache = self._resolve_feature_cache(request)
+            if feature_cache is not None and slot.backend.supports_feature_cache:
+                params["feature_cache"] = feature_cache.dict()
             result = await self._run_pipeline(
-                self.txt2img_pipe, callback, **pipeline_args
+                slot, task, params, callback, response_format, cancel
             )
-            return GenerationResponse(
+            response = GenerationResponse(
                 image_b64=result["image_b64"],
+                image_url=result["image_url"],
                 seed=actual_seed,
                 model_id=request.model_id,
+                backend=slot.backend.name,
                 generation_time=result["generation_time"],
                 nsfw_content_detected=result["nsfw_content_detected"],
+                stage_timings=result["stage_timings"],
             )
-        else:
-            raise RuntimeError("Text-to-Image pipeline not initialized")
+            return response, result["image_png"]
+
+    async def generate_txt2img(
+        self, request: Txt2ImgRequest, callback: Callable | None = None
+    ) -> GenerationResponse:
+        response, _ = await self.generate(request, callback)
+        return response
 
     async def generate_img2img(
         self, request: Img2ImgRequest, callback: Callable | None = None
     ) -> GenerationResponse:
-        self.load_model(request.model_id)
-        if request.lora_path and request.lora_path not in self.loaded_loras:
-            await self.load_lora(request.lora_path)
-        init_image_bytes = base64.b64decode(request.image_b64)
-        init_image = Image.open(io.BytesIO(init_image_bytes)).convert("RGB")
-        generator = self._get_generator(request.seed)
-        actual_seed = generator.seed()
-        pipeline_args = {
-            "prompt": request.prompt,
-            "negative_prompt": request.negative_prompt,
-            "image": init_image,
-            "strength": request.strength,
-            "num_inference_steps": request.num_inference_steps,
-            "guidance_scale": request.guidance_scale,
-            "generator": generator,
-            "lora_scale": request.lora_scale,
-        }
-        if self.img2img_pipe is not None:
-            result = await self._run_pipeline(
-                self.img2img_pipe, callback, **pipeline_args
-            )
-            return GenerationResponse(
-                image_b64=result["image_b64"],
-                seed=actual_seed,
-                model_id=request.model_id,
-                generation_time=result["generation_time"],
-                nsfw_content_detected=result["nsfw_content_detected"],
-            )
-        else:
-            raise RuntimeError("Image-to-Image pipeline not initialized")
+        response, _ = await self.generate(request, callback)
+        return response
 
 
 engine = GenerationEngine()
@@ -0,0 +1,120 @@
+"""Content-addressed on-disk store for generated images.
+
+Images are written once under ``settings.IMAGE_STORE_DIR`` as
+``<sha256[:2]>/<sha256>.png`` and served by ``GET /v1/images/<sha256>.png``.
+Because the name is the content hash, a stored file never changes and can be
+cached by browsers and proxies for as long as it exists. A garbage collector,
+run every ``IMAGE_STORE_GC_INTERVAL_SECONDS`` off the request path, drops files
+older than ``IMAGE_STORE_TTL_SECONDS`` and then the least recently stored ones
+until the store fits in ``IMAGE_STORE_MAX_BYTES``.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ImageStore:
+    def __init__(
+        self, root: str, max_bytes: int, ttl_seconds: int, gc_interval_seconds: int
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.gc_interval_seconds = gc_interval_seconds
+        self._gc_lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_digest(digest: str) -> bool:
+        return bool(DIGEST_RE.match(digest))
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.png")
+
+    def url_for(self, digest: str) -> str:
+        return f"{settings.API_V1_STR}/images/{digest}.png"
+
+    def put(self, data: bytes) -> str:
+        """Stores PNG bytes and returns their digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        try:
+            # Refresh the mtime so the TTL counts from the latest request.
+            os.utime(path)
+        except FileNotFoundError:
+            # New, or removed by a GC pass since it was last stored.
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    async def collect_garbage_periodically(self):
+        """Runs ``collect_garbage`` every ``gc_interval_seconds`` until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.collect_garbage)
+            except Exception:
+                logger.exception("Image store GC failed")
+            await asyncio.sleep(self.gc_interval_seconds)
+
+    def collect_garbage(self) -> int:
+        """Removes expired files, then the oldest ones beyond ``max_bytes``."""
+        if not self._gc_lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.time()
+            entries = []
+            removed = 0
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if now - stat.st_mtime > self.ttl_seconds:
+                        removed += self._remove(path)
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total_bytes -= size
+            if removed:
+                logger.info(
+                    f"Image store GC removed {removed} files, {total_bytes} bytes remain."
+                )
+            return removed
+        finally:
+            self._gc_lock.release()
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except FileNotFoundError:
+            return 0
+
+
+image_store = ImageStore(
+    settings.IMAGE_STORE_DIR,
+    settings.IMAGE_STORE_MAX_BYTES,
+    settings.IMAGE_STORE_TTL_SECONDS,
+    settings.IMAGE_STORE_GC_INTERVAL_SECONDS,
+)
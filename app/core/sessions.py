@@ -0,0 +1,122 @@
+"""Jobs submitted over multiplexed WebSocket sessions.
+
+A session socket carries many jobs at once. Jobs are owned by the
+authenticated user rather than by the socket: when a connection drops they
+keep running, and a new connection from the same user can re-attach to them
+by job id until ``SESSION_RESUME_TTL_SECONDS`` after they finished.
+"""
+
+import asyncio
+import json
+import struct
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional
+from app.core.config import settings
+
+# Binary frames: 4-byte big-endian header length, JSON header, raw payload.
+FRAME_HEADER = struct.Struct(">I")
+
+FINISHED_STATUSES = ("completed", "cancelled", "failed")
+
+
+def pack_frame(header: dict[str, Any], payload: bytes) -> bytes:
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(encoded)) + encoded + payload
+
+
+class SessionJob:
+    def __init__(self, owner: str, client_id: Optional[str], kind: str, steps: int):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.client_id = client_id
+        self.kind = kind
+        self.steps = steps
+        self.status = "queued"
+        self.step = 0
+        self.response: Optional[dict[str, Any]] = None
+        self.png: Optional[bytes] = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.finished_at: Optional[float] = None
+        self.task = None
+        # Delivery function of the socket currently attached, if any.
+        self.listener: Optional[Callable[..., None]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def progress(self) -> float:
+        return self.step / self.steps if self.steps else 0.0
+
+    def finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+
+    def header(self, message_type: str) -> dict[str, Any]:
+        header = {"type": message_type, "job_id": self.id, "client_id": self.client_id}
+        if message_type == "progress":
+            header.update(progress=self.progress, step=self.step)
+        elif message_type == "result":
+            header["data"] = self.response
+        elif message_type == "error":
+            header["message"] = self.error
+        elif message_type == "status":
+            header.update(status=self.status, progress=self.progress, step=self.step)
+        return header
+
+    def final_message(self) -> tuple[dict[str, Any], Optional[bytes]]:
+        """The message that reports this job's outcome to a client."""
+        message_type = {
+            "completed": "result",
+            "cancelled": "cancelled",
+            "failed": "error",
+        }.get(self.status, "status")
+        return self.header(message_type), self.png
+
+    def notify(self, message_type: str):
+        if self.listener is None:
+            return
+        if message_type in ("result", "cancelled", "error"):
+            header, payload = self.final_message()
+        else:
+            header, payload = self.header(message_type), None
+        self.listener(self, header, payload)
+
+
+class SessionRegistry:
+    def __init__(self):
+        self.jobs: dict[str, SessionJob] = {}
+
+    def add(self, job: SessionJob):
+        self.purge()
+        self.jobs[job.id] = job
+
+    def get(self, owner: str, job_id: str) -> Optional[SessionJob]:
+        self.purge()
+        job = self.jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def unfinished(self, owner: str) -> int:
+        """Jobs of ``owner`` still queued or running, on any socket."""
+        return sum(not job.done for job in self.jobs.values() if job.owner == owner)
+
+    def schedule_purge(self):
+        """Purges once the resume window of a job finishing now has passed."""
+        loop = asyncio.get_running_loop()
+        loop.call_later(settings.SESSION_RESUME_TTL_SECONDS + 1, self.purge)
+
+    def purge(self):
+        """Forgets finished jobs whose resume window has passed."""
+        cutoff = time.time() - settings.SESSION_RESUME_TTL_SECONDS
+        for job_id, job in list(self.jobs.items()):
+            if job.done and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+
+session_jobs = SessionRegistry()
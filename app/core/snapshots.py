@@ -0,0 +1,286 @@
+"""Ready-to-map pipeline snapshots.
+
+A snapshot is a pipeline saved once per (model, dtype) under
+``settings.SNAPSHOT_DIR`` as plain safetensors files plus a ``manifest.json``
+that already holds the tensor index of every component. Loading a snapshot
+skips hub resolution, variant selection and dtype conversion: each weight file
+is memory-mapped and the tensors are views into the mapping, so worker
+processes loading the same snapshot share one copy in the OS page cache.
+"""
+
+import importlib
+import json
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import time
+from typing import Any
+
+import torch
+from accelerate import init_empty_weights
+from diffusers import AutoPipelineForText2Image, DiffusionPipeline, ModelMixin
+from diffusers import pipelines as diffusers_pipelines
+from app.core.backends.base import LoadReport
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+
+# Snapshots that failed to load in this process; not materialized again, so a
+# snapshot that can never load costs one hub load instead of a load plus a save.
+_unloadable: set[tuple[str, str]] = set()
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def _dtype_name(dtype: torch.dtype) -> str:
+    return str(dtype).removeprefix("torch.")
+
+
+def snapshot_dir(model_id: str, dtype: torch.dtype) -> str:
+    return os.path.join(
+        settings.SNAPSHOT_DIR, model_id.replace("/", "--"), _dtype_name(dtype)
+    )
+
+
+def read_manifest(model_id: str, dtype: torch.dtype) -> dict | None:
+    path = os.path.join(snapshot_dir(model_id, dtype), MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format_version") != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def _read_safetensors_index(path: str) -> dict[str, Any]:
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    return {"data_start": 8 + header_size, "tensors": header}
+
+
+def _mmap_state_dict(path: str, index: dict[str, Any]) -> dict[str, torch.Tensor]:
+    # MAP_PRIVATE mapping: pages come straight from the page cache and stay
+    # shared with other processes unless somebody writes to them.
+    size = os.path.getsize(path)
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=size)
+    buffer = torch.empty(0, dtype=torch.uint8).set_(storage)
+    data_start = index["data_start"]
+    state_dict = {}
+    for name, info in index["tensors"].items():
+        begin, end = info["data_offsets"]
+        raw = buffer[data_start + begin : data_start + end]
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        try:
+            tensor = raw.view(dtype)
+        except RuntimeError:
+            # Unaligned offset; fall back to a private copy of this tensor.
+            tensor = raw.clone().view(dtype)
+        state_dict[name] = tensor.reshape(info["shape"])
+    return state_dict
+
+
+def _build_manifest(root: str, model_id: str, dtype: torch.dtype) -> dict:
+    with open(os.path.join(root, DiffusionPipeline.config_name)) as f:
+        model_index = json.load(f)
+    components = {}
+    for name, value in model_index.items():
+        if name.startswith("_") or not isinstance(value, list) or len(value) != 2:
+            continue
+        library, class_name = value
+        if library is None:
+            # Disabled components (e.g. no safety checker) are passed as None.
+            components[name] = None
+            continue
+        component_dir = os.path.join(root, name)
+        weights = []
+        if os.path.isdir(component_dir):
+            for filename in sorted(os.listdir(component_dir)):
+                if filename.endswith(".safetensors"):
+                    path = os.path.join(component_dir, filename)
+                    weights.append(
+                        {
+                            "file": os.path.join(name, filename),
+                            "bytes": os.path.getsize(path),
+                            **_read_safetensors_index(path),
+                        }
+                    )
+        components[name] = {
+            "library": library,
+            "class": class_name,
+            "weights": weights,
+        }
+    return {
+        "format_version": FORMAT_VERSION,
+        "model_id": model_id,
+        "dtype": _dtype_name(dtype),
+        "pipeline_class": model_index["_class_name"],
+        "created_at": time.time(),
+        "components": components,
+    }
+
+
+def save_snapshot(pipe: DiffusionPipeline, model_id: str, dtype: torch.dtype) -> str:
+    """Materializes ``pipe`` as a snapshot; a no-op if one already exists."""
+    target = snapshot_dir(model_id, dtype)
+    if read_manifest(model_id, dtype) is not None:
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(target))
+    start_time = time.time()
+    try:
+        pipe.save_pretrained(tmp, safe_serialization=True)
+        manifest = _build_manifest(tmp, model_id, dtype)
+        with open(os.path.join(tmp, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            if read_manifest(model_id, dtype) is not None:
+                # Another worker won the race; keep its snapshot.
+                shutil.rmtree(tmp, ignore_errors=True)
+                return target
+            # Leftover of an interrupted materialization without a manifest.
+            shutil.rmtree(target, ignore_errors=True)
+            os.rename(tmp, target)
+    except OSError:
+        # Lost a second race, or the volume is read-only.
+        logger.exception(f"Could not materialize snapshot for {model_id}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        return target
+    logger.info(
+        f"Materialized snapshot for {model_id} in {time.time() - start_time:.2f}s at {target}"
+    )
+    return target
+
+
+def _component_class(library: str, class_name: str) -> type:
+    # As in diffusers, pipeline-specific components such as the SD safety
+    # checker are recorded under their pipeline module ("stable_diffusion").
+    if hasattr(diffusers_pipelines, library):
+        module = getattr(diffusers_pipelines, library)
+    else:
+        module = importlib.import_module(library)
+    return getattr(module, class_name)
+
+
+def _load_component(root: str, name: str, entry: dict):
+    cls = _component_class(entry["library"], entry["class"])
+    if not entry["weights"]:
+        return cls.from_pretrained(root, subfolder=name), 0
+    state_dict = {}
+    mapped_bytes = 0
+    for weights in entry["weights"]:
+        path = os.path.join(root, weights["file"])
+        state_dict.update(_mmap_state_dict(path, weights))
+        mapped_bytes += weights["bytes"]
+    with init_empty_weights():
+        if issubclass(cls, ModelMixin):
+            module = cls.from_config(cls.load_config(root, subfolder=name))
+        else:
+            config = cls.config_class.from_pretrained(os.path.join(root, name))
+            module = cls._from_config(config)
+    # assign=True keeps the mapped tensors (and their dtype) as the parameters.
+    missing, _ = module.load_state_dict(state_dict, strict=False, assign=True)
+    if missing and hasattr(module, "tie_weights"):
+        module.tie_weights()
+    empty = [key for key, param in module.named_parameters() if param.is_meta]
+    if empty:
+        raise ValueError(
+            f"Snapshot component {name} has no weights for: {', '.join(empty)}"
+        )
+    return module.eval(), mapped_bytes
+
+
+def load_snapshot(
+    manifest: dict, dtype: torch.dtype, device: str
+) -> tuple[DiffusionPipeline, LoadReport]:
+    root = snapshot_dir(manifest["model_id"], dtype)
+    start_time = time.time()
+    timings = {}
+    components = {}
+    mapped_bytes = 0
+    for name, entry in manifest["components"].items():
+        if entry is None:
+            components[name] = None
+            continue
+        component_start = time.time()
+        components[name], component_bytes = _load_component(root, name, entry)
+        mapped_bytes += component_bytes
+        timings[name] = time.time() - component_start
+    step_start = time.time()
+    pipe = DiffusionPipeline.from_pretrained(root, torch_dtype=dtype, **components)
+    timings["assemble"] = time.time() - step_start
+    step_start = time.time()
+    pipe = pipe.to(device)
+    timings["to_device"] = time.time() - step_start
+    return pipe, {
+        "model_id": manifest["model_id"],
+        "source": "snapshot",
+        "dtype": _dtype_name(dtype),
+        "total_time": time.time() - start_time,
+        "mapped_bytes": mapped_bytes,
+        "components": timings,
+    }
+
+
+def load_pipeline(
+    model_id: str, dtype: torch.dtype, device: str
+) -> tuple[DiffusionPipeline, LoadReport]:
+    """Loads a txt2img pipeline, preferring (and creating) a snapshot."""
+    if settings.USE_MODEL_SNAPSHOTS:
+        manifest = read_manifest(model_id, dtype)
+        if manifest is not None:
+            try:
+                return load_snapshot(manifest, dtype, device)
+            except Exception:
+                # Rebuilt from the hub below; a bad snapshot must not pin the
+                # model to a failing load.
+                logger.exception(f"Discarding unloadable snapshot for {model_id}")
+                shutil.rmtree(snapshot_dir(model_id, dtype), ignore_errors=True)
+                _unloadable.add((model_id, _dtype_name(dtype)))
+    start_time = time.time()
+    pipe = AutoPipelineForText2Image.from_pretrained(
+        model_id,
+        torch_dtype=dtype,
+        variant="fp16" if dtype == torch.float16 else None,
+        cache_dir=settings.MODEL_CACHE_DIR,
+    )
+    timings = {"from_pretrained": time.time() - start_time}
+    if (
+        settings.USE_MODEL_SNAPSHOTS
+        and (model_id, _dtype_name(dtype)) not in _unloadable
+    ):
+        step_start = time.time()
+        save_snapshot(pipe, model_id, dtype)
+        timings["save_snapshot"] = time.time() - step_start
+    step_start = time.time()
+    pipe = pipe.to(device)
+    timings["to_device"] = time.time() - step_start
+    return pipe, {
+        "model_id": model_id,
+        "source": "hub",
+        "dtype": _dtype_name(dtype),
+        "total_time": time.time() - start_time,
+        "mapped_bytes": 0,
+        "components": timings,
+    }
@@ -0,0 +1,111 @@
+"""Bounded execution stages for overlapping consecutive generation jobs.
+
+A job passes through denoise -> decode -> encode. Each stage has its own
+thread pool and admits at most ``workers + queue_size`` jobs. A job keeps its
+slot in one stage until the next stage has admitted it, so a full downstream
+queue holds back the upstream stage instead of letting intermediate results
+pile up. While job N is being decoded or PNG-encoded, job N+1 can already be
+denoising.
+"""
+
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+OCCUPANCY_WINDOW_SECONDS = 60.0
+
+
+class Stage:
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=f"stage-{name}"
+        )
+        self.waiting = 0
+        self.holding = 0
+        self.running = 0
+        self.avg_seconds: float | None = None
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._started: dict[int, float] = {}
+        self._finished: collections.deque[tuple[float, float]] = collections.deque()
+
+    async def acquire(self):
+        """Waits for room in this stage."""
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.holding += 1
+
+    def release(self):
+        self.holding -= 1
+        self._slots.release()
+
+    async def execute(self, fn: Callable, *args) -> Any:
+        """Runs ``fn`` on this stage's pool; the caller must hold a slot."""
+
+        def timed():
+            start_time = time.perf_counter()
+            with self._lock:
+                self.running += 1
+                self._started[threading.get_ident()] = start_time
+            try:
+                return fn(*args)
+            finally:
+                end_time = time.perf_counter()
+                elapsed = end_time - start_time
+                with self._lock:
+                    self.running -= 1
+                    del self._started[threading.get_ident()]
+                    self._finished.append((end_time, elapsed))
+                    self.avg_seconds = (
+                        elapsed
+                        if self.avg_seconds is None
+                        else 0.8 * self.avg_seconds + 0.2 * elapsed
+                    )
+
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(self.executor, timed)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The thread cannot be interrupted, so the caller keeps its slot
+            # until ``fn`` has returned.
+            await asyncio.wait([future])
+            if not future.cancelled():
+                future.exception()
+            raise
+
+    def occupancy(self) -> float:
+        """Fraction of worker time spent busy over the last minute."""
+        now = time.perf_counter()
+        window_start = now - OCCUPANCY_WINDOW_SECONDS
+        with self._lock:
+            while self._finished and self._finished[0][0] < window_start:
+                self._finished.popleft()
+            busy = sum(
+                min(elapsed, end_time - window_start)
+                for end_time, elapsed in self._finished
+            )
+            busy += sum(
+                now - max(start, window_start) for start in self._started.values()
+            )
+        return min(1.0, busy / (OCCUPANCY_WINDOW_SECONDS * self.workers))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "waiting": self.waiting,
+            "holding": self.holding,
+            "running": self.running,
+            "avg_seconds": self.avg_seconds,
+            "occupancy": self.occupancy(),
+        }
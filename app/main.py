@@ -1,13 +1,33 @@
-from fastapi import FastAPI
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.core.generation import engine
+from app.core.image_store import image_store
 from app.core.logging import setup_logging
 
 setup_logging()
+logger = logging.getLogger(__name__)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    gc_task = asyncio.create_task(image_store.collect_garbage_periodically())
+    yield
+    gc_task.cancel()
+    await engine.drain(settings.DRAIN_TIMEOUT_SECONDS)
+
+
 app = FastAPI(
     title="Image Generation REST API Service",
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -21,7 +41,37 @@ if settings.BACKEND_CORS_ORIGINS:
 
 @app.get("/health", status_code=200)
 async def health_check():
+    if engine.draining:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "draining"},
+        )
     return {"status": "ok"}
 
 
+@app.get("/capacity", status_code=200)
+async def capacity():
+    """Reports queue depth, expected wait, resident models and memory headroom."""
+    return engine.capacity()
+
+
+@app.post("/drain", status_code=status.HTTP_202_ACCEPTED)
+async def drain(request: Request):
+    """Stops admission, lets in-flight jobs finish and then shuts the server down.
+
+    Only accepted from the local host, e.g. from a container preStop hook.
+    """
+    if request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Drain is only allowed locally")
+
+    async def drain_and_exit():
+        await engine.drain(settings.DRAIN_TIMEOUT_SECONDS)
+        logger.info("Drain complete, shutting down.")
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    if not engine.draining:
+        app.state.drain_task = asyncio.create_task(drain_and_exit())
+    return engine.capacity()
+
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
\ No newline at end of file
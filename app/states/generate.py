@@ -91,7 +91,11 @@ class ImageGenState(rx.State):
 
     @rx.event
     def on_generation_result(self, data: dict):
-        self.generated_image = f"data:image/png;base64,{data['data']['image_b64']}"
+        image_url = data["data"].get("image_url")
+        if image_url:
+            self.generated_image = image_url
+        else:
+            self.generated_image = f"data:image/png;base64,{data['data']['image_b64']}"
         self.is_generating = False
 
     @rx.event
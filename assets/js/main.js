@@ -1,91 +1,206 @@
 // WebSocket client for streaming image generation progress
+//
+// One session socket is kept open and shared by all generations. Jobs are
+// tagged with client ids, progress and results arrive interleaved, and after
+// a reconnect unfinished jobs are resumed by their server job id.
 
-let ws = null;
+let session = null;
+let sessionToken = null;
+let reconnectDelay = 500;
+let nextClientId = 1;
+let resultObjectUrl = null;
+
+// client_id -> {request, kind, jobId, sent}
+const pendingJobs = new Map();
 
 function getHFToken() {
     // Retrieve HF token from localStorage (managed by HuggingFaceTokenState)
     return localStorage.getItem('hf_token') || '';
 }
 
-function startGeneration(params) {
-    const token = params.token || getHFToken();
-    
-    if (!token) {
-        console.error('No Hugging Face token available');
-        window.dispatchEvent(new CustomEvent('on_generation_error', {
-            detail: { message: 'Authentication required. Please set your Hugging Face token.' }
-        }));
-        return;
+function dispatch(name, detail) {
+    window.dispatchEvent(new CustomEvent(name, { detail: detail }));
+}
+
+function sendMessage(message) {
+    if (session && session.readyState === WebSocket.OPEN) {
+        session.send(JSON.stringify(message));
+        return true;
+    }
+    return false;
+}
+
+function flushPendingJobs() {
+    const resumeIds = [];
+    pendingJobs.forEach(function(job, clientId) {
+        if (job.jobId) {
+            resumeIds.push(job.jobId);
+        } else if (!job.sent) {
+            job.sent = sendMessage({
+                type: 'submit', client_id: clientId, kind: job.kind, request: job.request
+            });
+        }
+    });
+    if (resumeIds.length) {
+        sendMessage({ type: 'resume', job_ids: resumeIds });
     }
+}
 
-    // Close existing connection if any
-    if (ws && ws.readyState === WebSocket.OPEN) {
-        ws.close();
+// Binary frames: 4-byte big-endian header length, JSON header, PNG bytes.
+function parseFrame(buffer) {
+    const headerLength = new DataView(buffer).getUint32(0);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+    return { header: header, payload: buffer.slice(4 + headerLength) };
+}
+
+function handleMessage(message, payload) {
+    const job = pendingJobs.get(message.client_id);
+    switch (message.type) {
+        case 'ready':
+            reconnectDelay = 500;
+            flushPendingJobs();
+            break;
+        case 'ping':
+            sendMessage({ type: 'pong', ts: message.ts });
+            break;
+        case 'accepted':
+            if (job) job.jobId = message.job_id;
+            break;
+        case 'progress':
+            dispatch('on_generation_progress', { progress: message.progress, step: message.step });
+            break;
+        case 'status':
+            dispatch('on_generation_progress', { progress: message.progress, step: message.step });
+            break;
+        case 'result': {
+            const data = Object.assign({}, message.data);
+            if (payload) {
+                if (resultObjectUrl) URL.revokeObjectURL(resultObjectUrl);
+                resultObjectUrl = URL.createObjectURL(new Blob([payload], { type: 'image/png' }));
+                data.image_url = resultObjectUrl;
+            }
+            pendingJobs.delete(message.client_id);
+            dispatch('on_generation_result', { data: data });
+            break;
+        }
+        case 'cancelled':
+            pendingJobs.delete(message.client_id);
+            dispatch('on_generation_error', { message: 'Generation cancelled' });
+            break;
+        case 'error':
+            if (message.job_id && !message.client_id) {
+                // A job that can no longer be resumed.
+                pendingJobs.forEach(function(pending, clientId) {
+                    if (pending.jobId === message.job_id) pendingJobs.delete(clientId);
+                });
+            } else if (message.client_id) {
+                pendingJobs.delete(message.client_id);
+            }
+            dispatch('on_generation_error', { message: message.message });
+            break;
     }
+}
 
-    // Establish WebSocket connection with token authentication
+function connect(token) {
+    sessionToken = token;
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${wsProtocol}//${window.location.host}/api/v1/stream/generate/txt2img?token=${encodeURIComponent(token)}`;
-    
-    ws = new WebSocket(wsUrl);
-
-    ws.onopen = function() {
-        console.log('WebSocket connected');
-        
-        // Send generation request
-        const request = {
-            prompt: params.prompt,
-            negative_prompt: params.negative_prompt,
-            model_id: params.model_id,
-            num_inference_steps: params.num_inference_steps,
-            guidance_scale: params.guidance_scale,
-            seed: params.seed,
-            height: params.height,
-            width: params.width,
-            lora_path: params.lora_path || null,
-            lora_scale: params.lora_scale || 0.8
-        };
-        
-        ws.send(JSON.stringify(request));
-        
-        // Dispatch generation start event
-        window.dispatchEvent(new CustomEvent('on_generation_start', { detail: {} }));
-    };
+    const wsUrl = `${wsProtocol}//${window.location.host}/api/v1/stream/session?token=${encodeURIComponent(token)}`;
+
+    const ws = new WebSocket(wsUrl);
+    ws.binaryType = 'arraybuffer';
+    session = ws;
 
     ws.onmessage = function(event) {
-        const data = JSON.parse(event.data);
-        
-        if (data.type === 'progress') {
-            // Dispatch progress update event
-            window.dispatchEvent(new CustomEvent('on_generation_progress', {
-                detail: { progress: data.progress, step: data.step }
-            }));
-        } else if (data.type === 'result') {
-            // Dispatch completion event with image data
-            window.dispatchEvent(new CustomEvent('on_generation_result', {
-                detail: { data: data.data }
-            }));
-            ws.close();
-        } else if (data.type === 'error') {
-            // Dispatch error event
-            window.dispatchEvent(new CustomEvent('on_generation_error', {
-                detail: { message: data.message }
-            }));
-            ws.close();
+        if (typeof event.data === 'string') {
+            handleMessage(JSON.parse(event.data), null);
+        } else {
+            const frame = parseFrame(event.data);
+            handleMessage(frame.header, frame.payload);
         }
     };
 
     ws.onerror = function(error) {
         console.error('WebSocket error:', error);
-        window.dispatchEvent(new CustomEvent('on_generation_error', {
-            detail: { message: 'WebSocket connection failed' }
-        }));
     };
 
     ws.onclose = function(event) {
         console.log('WebSocket closed:', event.code, event.reason);
+        if (session !== ws) return;
+        session = null;
+        pendingJobs.forEach(function(job) { job.sent = Boolean(job.jobId); });
+        if (event.code === 1008) {
+            pendingJobs.clear();
+            dispatch('on_generation_error', { message: 'Authentication failed. Please check your Hugging Face token.' });
+            return;
+        }
+        if (pendingJobs.size) {
+            // Unfinished jobs keep running on the server; reconnect and resume.
+            setTimeout(function() { if (!session) connect(sessionToken); }, reconnectDelay);
+            reconnectDelay = Math.min(reconnectDelay * 2, 10000);
+        }
     };
 }
 
-// Make function available globally
+function ensureSession(token) {
+    if (session && sessionToken !== token) {
+        const previous = session;
+        session = null;
+        previous.close();
+    }
+    if (!session) {
+        connect(token);
+    }
+}
+
+function startGeneration(params) {
+    const token = params.token || getHFToken();
+
+    if (!token) {
+        console.error('No Hugging Face token available');
+        dispatch('on_generation_error', {
+            message: 'Authentication required. Please set your Hugging Face token.'
+        });
+        return null;
+    }
+
+    const clientId = String(nextClientId++);
+    const request = {
+        prompt: params.prompt,
+        negative_prompt: params.negative_prompt,
+        model_id: params.model_id,
+        num_inference_steps: params.num_inference_steps,
+        guidance_scale: params.guidance_scale,
+        seed: params.seed,
+        lora_path: params.lora_path || null,
+        lora_scale: params.lora_scale || 0.8
+    };
+    let kind = 'txt2img';
+    if (params.image_b64) {
+        kind = 'img2img';
+        request.image_b64 = params.image_b64;
+        request.strength = params.strength || 0.8;
+    } else {
+        request.height = params.height;
+        request.width = params.width;
+    }
+    pendingJobs.set(clientId, { request: request, kind: kind, jobId: null, sent: false });
+
+    ensureSession(token);
+    flushPendingJobs();
+    dispatch('on_generation_start', { client_id: clientId });
+    return clientId;
+}
+
+function cancelGeneration(clientId) {
+    const job = pendingJobs.get(clientId);
+    if (!job) return;
+    if (job.jobId || job.sent) {
+        sendMessage({ type: 'cancel', client_id: clientId, job_id: job.jobId });
+    } else {
+        pendingJobs.delete(clientId);
+    }
+}
+
+// Make functions available globally
 window.startGeneration = startGeneration;
+window.cancelGeneration = cancelGeneration;
@@ -0,0 +1,129 @@
+"""Benchmarks UNet feature caching against full computation on CPU.
+
+For each cache interval the same seeded txt2img run is timed and its output
+compared with the full-computation image (PSNR and mean absolute pixel error).
+By default a small randomly initialised Stable Diffusion pipeline is built
+locally, so the benchmark runs offline; pass ``--model`` to use a hub
+checkpoint such as ``hf-internal-testing/tiny-stable-diffusion-pipe`` instead.
+
+    python -m scripts.benchmark_feature_cache --steps 25 --intervals 2 3 5
+"""
+
+import argparse
+import contextlib
+import math
+import statistics
+import time
+import torch
+from diffusers import (
+    AutoencoderKL,
+    DDIMScheduler,
+    StableDiffusionPipeline,
+    UNet2DConditionModel,
+)
+from PIL import Image, ImageChops, ImageStat
+from app.core.feature_cache import UNetFeatureCache
+
+CROSS_ATTENTION_DIM = 64
+
+
+def build_random_pipeline(seed: int) -> StableDiffusionPipeline:
+    torch.manual_seed(seed)
+    unet = UNet2DConditionModel(
+        sample_size=32,
+        block_out_channels=(64, 128, 256),
+        layers_per_block=2,
+        down_block_types=(
+            "DownBlock2D",
+            "CrossAttnDownBlock2D",
+            "CrossAttnDownBlock2D",
+        ),
+        up_block_types=("CrossAttnUpBlock2D", "CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=CROSS_ATTENTION_DIM,
+        attention_head_dim=8,
+    )
+    vae = AutoencoderKL(
+        block_out_channels=(32, 64),
+        down_block_types=("DownEncoderBlock2D", "DownEncoderBlock2D"),
+        up_block_types=("UpDecoderBlock2D", "UpDecoderBlock2D"),
+        latent_channels=4,
+    )
+    return StableDiffusionPipeline(
+        vae=vae,
+        text_encoder=None,
+        tokenizer=None,
+        unet=unet,
+        scheduler=DDIMScheduler(clip_sample=False),
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False,
+    )
+
+
+def psnr(a: Image.Image, b: Image.Image) -> tuple[float, float]:
+    diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+    stat = ImageStat.Stat(diff)
+    mse = statistics.mean(stat.sum2[c] / stat.count[c] for c in range(3))
+    mae = statistics.mean(stat.mean)
+    return (math.inf if mse == 0 else 10 * math.log10(255**2 / mse)), mae
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", help="Hub model id; default is a random tiny model.")
+    parser.add_argument("--steps", type=int, default=25)
+    parser.add_argument("--intervals", type=int, nargs="+", default=[2, 3, 5])
+    parser.add_argument("--start-step", type=int, default=0)
+    parser.add_argument("--end-step", type=int, default=None)
+    parser.add_argument("--size", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.model:
+        pipe = StableDiffusionPipeline.from_pretrained(args.model, safety_checker=None)
+        call_kwargs = {"prompt": "a photo of an astronaut riding a horse"}
+    else:
+        pipe = build_random_pipeline(args.seed)
+        generator = torch.Generator().manual_seed(args.seed)
+        embeds = torch.randn(1, 77, CROSS_ATTENTION_DIM, generator=generator)
+        call_kwargs = {
+            "prompt_embeds": embeds,
+            "negative_prompt_embeds": torch.zeros_like(embeds),
+        }
+    pipe.set_progress_bar_config(disable=True)
+    size = args.size or pipe.unet.config.sample_size * pipe.vae_scale_factor
+    call_kwargs.update(num_inference_steps=args.steps, height=size, width=size)
+    cache = UNetFeatureCache(pipe.unet)
+
+    def run(interval: int = 1) -> tuple[float, Image.Image]:
+        timings = []
+        for _ in range(args.repeats):
+            generator = torch.Generator().manual_seed(args.seed)
+            accelerated = (
+                cache.enabled(interval, args.start_step, args.end_step)
+                if interval > 1
+                else contextlib.nullcontext()
+            )
+            start_time = time.perf_counter()
+            with accelerated:
+                image = pipe(generator=generator, **call_kwargs).images[0]
+            timings.append(time.perf_counter() - start_time)
+        return statistics.median(timings), image
+
+    with torch.inference_mode():
+        run()  # warm-up
+        baseline_time, baseline = run()
+        print(f"{'interval':>8} {'seconds':>8} {'speedup':>8} {'psnr_db':>8} {'mae':>6}")
+        print(f"{'full':>8} {baseline_time:8.3f} {1.0:8.2f} {math.inf:8.2f} {0.0:6.2f}")
+        for interval in args.intervals:
+            elapsed, image = run(interval)
+            similarity, mae = psnr(baseline, image)
+            print(
+                f"{interval:>8} {elapsed:8.3f} {baseline_time / elapsed:8.2f} "
+                f"{similarity:8.2f} {mae:6.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
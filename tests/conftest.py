@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+# Settings are read at import time, so configure them before importing app.
+_tmp = tempfile.mkdtemp(prefix="image-service-tests-")
+os.environ.setdefault("DEFAULT_MODEL_ID", "fake")
+os.environ.setdefault("DEFAULT_BACKEND", "fake")
+os.environ.setdefault("IMAGE_STORE_DIR", os.path.join(_tmp, "images"))
+os.environ.setdefault("SNAPSHOT_DIR", os.path.join(_tmp, "snapshots"))
+os.environ.setdefault("LOG_DIR", os.path.join(_tmp, "logs"))
+
+import pytest  # noqa: E402
+from app.core.generation import GenerationEngine  # noqa: E402
+
+
+@pytest.fixture
+def engine() -> GenerationEngine:
+    """A fresh engine serving the fake backend."""
+    engine = GenerationEngine()
+    engine.model_registry["fake"] = {"repo_id": "fake", "backend": "fake"}
+    engine.load_model("fake")
+    return engine
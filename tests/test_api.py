@@ -0,0 +1,61 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.api import deps
+from app.api.v1.models import Txt2ImgRequest
+from app.core.generation import engine as app_engine
+from app.main import app
+
+
+def test_capacity_reports_queue_and_models():
+    client = TestClient(app)
+
+    body = client.get("/capacity").json()
+
+    assert body["draining"] is False
+    assert body["queue_depth"] == 0
+    assert body["active_jobs"] == 0
+    assert body["max_concurrent_jobs"] == 1
+    assert set(body["stages"]) == {"denoise", "decode", "encode"}
+    assert body["models"][0]["model_id"] == "fake"
+    assert body["models"][0]["serving"] is True
+    assert "ram_available_mb" in body["memory"]
+
+
+def test_health_and_generate_refused_while_draining(monkeypatch):
+    monkeypatch.setattr(app_engine, "draining", True)
+    app.dependency_overrides[deps.get_current_user] = lambda: {"name": "tester"}
+    client = TestClient(app)
+    try:
+        health = client.get("/health")
+        generate = client.post(
+            "/api/v1/generate/txt2img",
+            json={"prompt": "a lighthouse", "model_id": "fake"},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert health.status_code == 503
+    assert health.json() == {"status": "draining"}
+    assert generate.status_code == 503
+
+
+def test_drain_waits_for_admitted_jobs(engine, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.FAKE_BACKEND_STEP_SECONDS", 0.02)
+    request = Txt2ImgRequest(
+        prompt="a lighthouse", model_id="fake", num_inference_steps=5
+    )
+
+    async def run():
+        job = asyncio.create_task(engine.generate_txt2img(request))
+        await asyncio.sleep(0.02)
+        assert engine.admitted_jobs == 1
+        drained = await engine.drain(timeout=10)
+        return drained, job
+
+    drained, job = asyncio.run(run())
+
+    assert drained is True
+    assert job.done() and job.result().model_id == "fake"
+    assert engine.admitted_jobs == 0
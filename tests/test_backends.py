@@ -0,0 +1,23 @@
+from app.core import backends
+from app.core.generation import GenerationEngine
+
+
+def test_backend_available_checks_optional_dependencies(monkeypatch):
+    monkeypatch.setattr(backends.importlib.util, "find_spec", lambda name: None)
+
+    assert backends.backend_available("diffusers")
+    assert not backends.backend_available("onnxruntime")
+    assert not backends.backend_available("openvino")
+    assert not backends.backend_available("tensorrt")
+
+
+def test_models_without_installed_backend_are_not_registered(monkeypatch):
+    monkeypatch.setattr(
+        "app.core.generation.backend_available", lambda name: name != "openvino"
+    )
+
+    registry = GenerationEngine().model_registry
+
+    assert "sd-1-5-onnx" in registry
+    assert "sd-1-5-openvino" not in registry
+    assert all(spec["backend"] != "openvino" for spec in registry.values())
@@ -0,0 +1,87 @@
+import torch
+from diffusers import UNet2DConditionModel
+
+from app.core.feature_cache import UNetFeatureCache
+
+
+def make_unet() -> UNet2DConditionModel:
+    torch.manual_seed(0)
+    return UNet2DConditionModel(
+        block_out_channels=(8, 16),
+        layers_per_block=1,
+        norm_num_groups=8,
+        sample_size=8,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=8,
+        attention_head_dim=4,
+    ).eval()
+
+
+def run_steps(unet, steps: int):
+    sample = torch.randn(1, 4, 8, 8)
+    hidden = torch.randn(1, 2, 8)
+    with torch.no_grad():
+        for t in range(steps):
+            unet(sample, t, encoder_hidden_states=hidden)
+
+
+def count_block_calls(cache: UNetFeatureCache) -> list[int]:
+    """Wraps each deep block so calls that actually run it are counted."""
+    calls = [0]
+    for block in cache.blocks:
+        forward = block.forward
+
+        def counted(*args, _forward=forward, **kwargs):
+            calls[0] += 1
+            return _forward(*args, **kwargs)
+
+        block.forward = counted
+    return calls
+
+
+def test_reuses_deep_features_only_between_interval_steps():
+    unet = make_unet()
+    cache = UNetFeatureCache(unet)
+    calls = count_block_calls(cache)
+
+    with cache.enabled(interval=3):
+        run_steps(unet, 7)
+
+    # Steps 0, 3 and 6 run in full; 1, 2, 4 and 5 reuse.
+    assert cache.reused_steps == 4
+    assert calls[0] == 3 * len(cache.blocks)
+
+
+def test_steps_outside_range_run_in_full():
+    unet = make_unet()
+    cache = UNetFeatureCache(unet)
+    calls = count_block_calls(cache)
+
+    with cache.enabled(interval=3, start_step=2, end_step=5):
+        run_steps(unet, 7)
+
+    # Only steps 3 and 4 are reused.
+    assert cache.reused_steps == 2
+    assert calls[0] == 5 * len(cache.blocks)
+
+
+def test_block_forwards_restored_after_exit():
+    unet = make_unet()
+    cache = UNetFeatureCache(unet)
+    expected = unet(
+        torch.ones(1, 4, 8, 8), 0, encoder_hidden_states=torch.ones(1, 2, 8)
+    ).sample.detach()
+
+    with cache.enabled(interval=2):
+        run_steps(unet, 3)
+
+    assert all("forward" not in block.__dict__ for block in cache.blocks)
+    assert not unet._forward_pre_hooks
+    with torch.no_grad():
+        actual = unet(
+            torch.ones(1, 4, 8, 8), 0, encoder_hidden_states=torch.ones(1, 2, 8)
+        ).sample
+    assert torch.allclose(actual, expected)
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+import pytest
+from app.api.v1.models import Txt2ImgRequest
+from app.core.config import settings
+from app.core.generation import JobCancelled
+
+
+def make_request(seed: int, **kwargs) -> Txt2ImgRequest:
+    return Txt2ImgRequest(
+        prompt="a lighthouse",
+        model_id="fake",
+        seed=seed,
+        num_inference_steps=4,
+        **kwargs,
+    )
+
+
+def assert_stages_idle(engine):
+    for stage in engine.stages:
+        assert (stage.waiting, stage.holding, stage.running) == (0, 0, 0), stage.name
+
+
+def test_next_job_denoises_while_previous_encodes(engine, monkeypatch):
+    # Each side waits for the other, so this only passes if the two overlap.
+    second_denoising = threading.Event()
+    first_encoding = threading.Event()
+    overlapped = []
+    backend = engine.active.backend
+    denoise = backend.txt2img_latents
+    encode = engine._encode_image
+
+    def txt2img_latents(params, on_step=None):
+        if params["seed"] == 2:
+            second_denoising.set()
+            overlapped.append(first_encoding.wait(timeout=5))
+        return denoise(params, on_step)
+
+    def encode_image(image, response_format):
+        if not first_encoding.is_set():
+            first_encoding.set()
+            overlapped.append(second_denoising.wait(timeout=5))
+        return encode(image, response_format)
+
+    monkeypatch.setattr(backend, "txt2img_latents", txt2img_latents)
+    monkeypatch.setattr(engine, "_encode_image", encode_image)
+
+    async def run():
+        return await asyncio.gather(
+            engine.generate_txt2img(make_request(1)),
+            engine.generate_txt2img(make_request(2)),
+        )
+
+    first, second = asyncio.run(run())
+    assert overlapped == [True, True]
+    assert first.image_b64 and second.image_b64
+    assert set(first.stage_timings) == {"queued", "denoise", "decode", "encode"}
+    assert_stages_idle(engine)
+
+
+def test_retired_model_released_after_in_flight_drains(engine, monkeypatch):
+    engine.model_registry["other"] = {"repo_id": "other", "backend": "fake"}
+    old_slot = engine.active
+    released = []
+    monkeypatch.setattr(old_slot.backend, "release", lambda: released.append(True))
+    entered = threading.Event()
+    proceed = threading.Event()
+    denoise = old_slot.backend.txt2img_latents
+
+    def txt2img_latents(params, on_step=None):
+        entered.set()
+        assert proceed.wait(timeout=5)
+        return denoise(params, on_step)
+
+    monkeypatch.setattr(old_slot.backend, "txt2img_latents", txt2img_latents)
+
+    async def run():
+        job = asyncio.create_task(engine.generate_txt2img(make_request(1)))
+        await asyncio.get_running_loop().run_in_executor(None, entered.wait, 5)
+        load = engine.request_model_load("other")
+        await load.task
+        assert load.status == "ready"
+        assert engine.active is not old_slot
+        assert old_slot.retired and old_slot.in_flight == 1
+        assert old_slot in engine.retired_slots and not released
+        proceed.set()
+        response = await job
+        assert response.model_id == "fake"
+
+    asyncio.run(run())
+    assert old_slot.in_flight == 0
+    assert released == [True]
+    assert engine.retired_slots == []
+
+
+def test_load_handles_kept_up_to_cap(engine):
+    engine.model_registry["other"] = {"repo_id": "other", "backend": "fake"}
+
+    async def run():
+        handles = []
+        for i in range(engine.MAX_TRACKED_LOAD_JOBS + 8):
+            job = engine.request_model_load("other" if i % 2 else "fake")
+            if job.task is not None:
+                await job.task
+            handles.append(job.id)
+            if len(handles) == 20:
+                # Below the cap nothing is evicted.
+                assert list(engine.load_jobs) == handles
+        return handles
+
+    handles = asyncio.run(run())
+    assert len(engine.load_jobs) == engine.MAX_TRACKED_LOAD_JOBS
+    assert list(engine.load_jobs) == handles[-engine.MAX_TRACKED_LOAD_JOBS :]
+
+
+def test_failed_load_keeps_current_model(engine):
+    engine.model_registry["broken"] = {"repo_id": "broken", "backend": "missing"}
+    slot = engine.active
+
+    async def run():
+        job = engine.request_model_load("broken")
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == "failed" and "missing" in job.error
+    assert engine.active is slot
+
+
+def test_cancel_releases_stage_slots(engine, monkeypatch):
+    monkeypatch.setattr(settings, "FAKE_BACKEND_STEP_SECONDS", 0.01)
+    cancel = threading.Event()
+    steps = []
+
+    async def callback(step, timestep, latents):
+        steps.append(step)
+        if step == 1:
+            cancel.set()
+
+    async def run():
+        with pytest.raises(JobCancelled):
+            await engine.generate(make_request(1), callback, cancel=cancel)
+        assert_stages_idle(engine)
+        # The freed slots serve the next job.
+        return await engine.generate_txt2img(make_request(2))
+
+    response = asyncio.run(run())
+    assert response.image_b64
+    assert len(steps) < 4
+    assert engine.admitted_jobs == 0
+
+
+def test_cancel_before_start(engine):
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(JobCancelled):
+        asyncio.run(engine.generate(make_request(1), cancel=cancel))
+    assert_stages_idle(engine)
+
+
+def test_cancelled_task_keeps_slot_until_thread_returns(engine, monkeypatch):
+    monkeypatch.setattr(settings, "FAKE_BACKEND_STEP_SECONDS", 0.02)
+
+    async def run():
+        job = asyncio.create_task(engine.generate_txt2img(make_request(1)))
+        while engine.denoise_stage.running == 0:
+            await asyncio.sleep(0.005)
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+        # The denoising thread cannot be interrupted; its slot is only given
+        # back once it has returned.
+        assert_stages_idle(engine)
+
+    asyncio.run(run())
+    assert engine.admitted_jobs == 0
+
+
+def test_png_format_returns_raw_bytes(engine):
+    response, png = asyncio.run(engine.generate(make_request(1), raw_png=True))
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    assert response.image_b64 is None and response.image_url is None
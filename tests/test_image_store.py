@@ -0,0 +1,91 @@
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.core import image_store as image_store_module
+from app.core.image_store import ImageStore, image_store
+from app.main import app
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+
+
+@pytest.fixture
+def store(tmp_path) -> ImageStore:
+    return ImageStore(
+        str(tmp_path), max_bytes=1024, ttl_seconds=60, gc_interval_seconds=1
+    )
+
+
+def age(path: str, seconds: float):
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_put_is_content_addressed(store):
+    digest = store.put(PNG)
+    assert store.put(PNG) == digest
+    with open(store.path_for(digest), "rb") as f:
+        assert f.read() == PNG
+    assert store.url_for(digest).endswith(f"/images/{digest}.png")
+
+
+def test_put_rewrites_file_removed_concurrently(store, monkeypatch):
+    digest = store.put(PNG)
+    path = store.path_for(digest)
+    utime = os.utime
+
+    def utime_after_gc(target, *args, **kwargs):
+        # A GC pass in another encode worker removes the file first.
+        os.remove(target)
+        return utime(target, *args, **kwargs)
+
+    monkeypatch.setattr(image_store_module.os, "utime", utime_after_gc)
+    assert store.put(PNG) == digest
+    assert os.path.isfile(path)
+
+
+def test_collect_garbage_drops_expired_files(store):
+    expired = store.path_for(store.put(PNG))
+    fresh = store.path_for(store.put(PNG[::-1]))
+    age(expired, 120)
+
+    assert store.collect_garbage() == 1
+    assert not os.path.exists(expired)
+    assert os.path.exists(fresh)
+
+
+def test_collect_garbage_evicts_oldest_beyond_max_bytes(store):
+    paths = [store.path_for(store.put(PNG + bytes([i]) * 400)) for i in range(3)]
+    for seconds, path in zip((30, 20, 10), paths):
+        age(path, seconds)
+
+    assert store.collect_garbage() == 2
+    assert [os.path.exists(path) for path in paths] == [False, False, True]
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def test_image_endpoint_caching(client):
+    digest = image_store.put(PNG)
+    url = image_store.url_for(digest)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["etag"] == f'"{digest}"'
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(url, headers={"If-None-Match": f'"{digest}"'})
+    assert response.status_code == 304
+
+    response = client.get(url, headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.content == PNG[:8]
+
+
+def test_image_endpoint_rejects_unknown_names(client):
+    assert client.get("/api/v1/images/not-a-digest.png").status_code == 404
+    assert client.get(f"/api/v1/images/{'0' * 64}.png").status_code == 404
@@ -0,0 +1,128 @@
+import asyncio
+import io
+import json
+import struct
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.websockets import WebSocketDisconnect
+from app.api import deps
+from app.core.config import settings
+from app.core.generation import engine
+from app.core.sessions import pack_frame
+
+
+def unpack_frame(frame: bytes) -> tuple[dict, bytes]:
+    (header_length,) = struct.unpack(">I", frame[:4])
+    header = json.loads(frame[4 : 4 + header_length])
+    return header, frame[4 + header_length :]
+
+
+def test_pack_frame_layout():
+    header = {"type": "result", "job_id": "abc", "client_id": "1"}
+    payload = b"\x89PNG\r\n\x1a\nrest"
+    frame = pack_frame(header, payload)
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    assert frame[:4] == len(encoded).to_bytes(4, "big")
+    assert frame[4 : 4 + len(encoded)] == encoded
+    assert unpack_frame(frame) == (header, payload)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from app.main import app
+
+    async def get_current_user(token=None):
+        if token != "valid":
+            raise HTTPException(status_code=401, detail="Invalid Hugging Face token")
+        return {"name": "tester"}
+
+    monkeypatch.setattr(deps, "get_current_user", get_current_user)
+    # The app's lifespan drains the shared engine on exit; undone afterwards.
+    monkeypatch.setattr(engine, "draining", False)
+    # Each client runs its own event loop; a semaphore binds to the first one.
+    for stage in engine.stages:
+        monkeypatch.setattr(stage, "_slots", asyncio.Semaphore(stage.capacity))
+    with TestClient(app) as client:
+        yield client
+
+
+def receive(ws) -> tuple[dict, bytes | None]:
+    message = ws.receive()
+    if message.get("bytes") is not None:
+        return unpack_frame(message["bytes"])
+    return json.loads(message["text"]), None
+
+
+def test_session_rejects_invalid_token(client):
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect("/api/v1/stream/session?token=bad") as ws:
+            ws.receive_text()
+    assert excinfo.value.code == 1008
+
+
+def test_session_multiplexes_jobs(client):
+    request = {"prompt": "a lighthouse", "model_id": "fake", "num_inference_steps": 3}
+    with client.websocket_connect("/api/v1/stream/session?token=valid") as ws:
+        assert receive(ws)[0]["type"] == "ready"
+        for client_id, seed in (("a", 1), ("b", 2)):
+            submit = {"request": {**request, "seed": seed}, "client_id": client_id}
+            ws.send_text(json.dumps({"type": "submit", "kind": "txt2img", **submit}))
+        results = {}
+        while len(results) < 2:
+            header, payload = receive(ws)
+            assert header["type"] in ("accepted", "progress", "result"), header
+            if header["type"] == "result":
+                results[header["client_id"]] = (header, payload)
+    for client_id, seed in (("a", 1), ("b", 2)):
+        header, payload = results[client_id]
+        assert header["data"]["seed"] == seed
+        assert header["data"]["image_b64"] is None
+        assert Image.open(io.BytesIO(payload)).format == "PNG"
+
+
+def test_session_survives_bad_messages(client):
+    with client.websocket_connect("/api/v1/stream/session?token=valid") as ws:
+        assert receive(ws)[0]["type"] == "ready"
+        for message in ("[1, 2]", '"submit"', "not json"):
+            ws.send_text(message)
+            header, _ = receive(ws)
+            assert header == {
+                "type": "error",
+                "message": "Messages must be JSON objects.",
+            }
+        for request in ([1, 2], "a lighthouse", {"prompt": 3}):
+            submit = {"type": "submit", "client_id": "a", "request": request}
+            ws.send_text(json.dumps(submit))
+            header, _ = receive(ws)
+            assert header["type"] == "error" and header["client_id"] == "a"
+        ws.send_text(json.dumps({"type": "resume", "job_ids": "abc"}))
+        assert receive(ws)[0]["type"] == "error"
+        ws.send_text(json.dumps({"type": "ping", "ts": 1}))
+        assert receive(ws)[0] == {"type": "pong", "ts": 1}
+
+
+def test_cancel_queued_job_does_not_wait_for_a_slot(client, monkeypatch):
+    monkeypatch.setattr(settings, "FAKE_BACKEND_STEP_SECONDS", 0.05)
+    request = {"prompt": "a lighthouse", "model_id": "fake", "num_inference_steps": 6}
+    with client.websocket_connect("/api/v1/stream/session?token=valid") as ws:
+        assert receive(ws)[0]["type"] == "ready"
+        for client_id in ("a", "b"):
+            submit = {"type": "submit", "client_id": client_id, "request": request}
+            ws.send_text(json.dumps(submit))
+        ws.send_text(json.dumps({"type": "cancel", "client_id": "b"}))
+        finished = []
+        progress_of_a = []
+        steps_before_cancel = None
+        while len(finished) < 2:
+            header, _ = receive(ws)
+            if header["type"] in ("result", "cancelled", "error"):
+                finished.append((header["client_id"], header["type"]))
+                if header["type"] == "cancelled":
+                    steps_before_cancel = len(progress_of_a)
+            if header["type"] == "progress":
+                progress_of_a.append(header["step"])
+    assert finished == [("b", "cancelled"), ("a", "result")]
+    # "b" stopped waiting for the denoise worker while "a" was still using it.
+    assert steps_before_cancel < 6
@@ -0,0 +1,153 @@
+import json
+import os
+import pytest
+import torch
+from diffusers import (
+    AutoencoderKL,
+    DDIMScheduler,
+    StableDiffusionPipeline,
+    UNet2DConditionModel,
+)
+from diffusers.pipelines.stable_diffusion.safety_checker import (
+    StableDiffusionSafetyChecker,
+)
+from transformers import CLIPConfig, CLIPImageProcessor, CLIPTextConfig, CLIPTextModel
+from app.core import snapshots
+from app.core.config import settings
+
+MODEL_ID = "test/tiny-sd"
+CLIP_LAYER = {
+    "hidden_size": 32,
+    "intermediate_size": 37,
+    "num_attention_heads": 4,
+    "num_hidden_layers": 2,
+}
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshots, "_unloadable", set())
+
+
+@pytest.fixture
+def pipe() -> StableDiffusionPipeline:
+    torch.manual_seed(0)
+    unet = UNet2DConditionModel(
+        sample_size=8,
+        block_out_channels=(32, 64),
+        layers_per_block=1,
+        down_block_types=("CrossAttnDownBlock2D", "DownBlock2D"),
+        up_block_types=("UpBlock2D", "CrossAttnUpBlock2D"),
+        cross_attention_dim=32,
+        attention_head_dim=8,
+    )
+    vae = AutoencoderKL(
+        block_out_channels=(32, 64),
+        down_block_types=("DownEncoderBlock2D", "DownEncoderBlock2D"),
+        up_block_types=("UpDecoderBlock2D", "UpDecoderBlock2D"),
+        latent_channels=4,
+    )
+    text_encoder = CLIPTextModel(
+        CLIPTextConfig(vocab_size=1000, projection_dim=32, **CLIP_LAYER)
+    )
+    vision = {"image_size": 32, "patch_size": 4, **CLIP_LAYER}
+    safety_checker = StableDiffusionSafetyChecker(
+        CLIPConfig(text_config=CLIP_LAYER, vision_config=vision, projection_dim=32)
+    )
+    return StableDiffusionPipeline(
+        vae=vae,
+        text_encoder=text_encoder,
+        tokenizer=None,
+        unet=unet,
+        scheduler=DDIMScheduler(),
+        safety_checker=safety_checker.eval(),
+        feature_extractor=CLIPImageProcessor(crop_size=32, size=32),
+        image_encoder=None,
+    )
+
+
+def assert_same_weights(a: torch.nn.Module, b: torch.nn.Module):
+    expected, actual = a.state_dict(), b.state_dict()
+    assert expected.keys() == actual.keys()
+    for key in expected:
+        assert torch.equal(expected[key], actual[key]), key
+
+
+def test_round_trip(pipe):
+    snapshots.save_snapshot(pipe, MODEL_ID, torch.float32)
+    manifest = snapshots.read_manifest(MODEL_ID, torch.float32)
+    components = manifest["components"]
+    assert components["tokenizer"] is None
+    # diffusers records the safety checker under its pipeline module.
+    assert components["safety_checker"]["library"] == "stable_diffusion"
+
+    loaded, report = snapshots.load_snapshot(manifest, torch.float32, "cpu")
+
+    assert report["source"] == "snapshot"
+    assert report["mapped_bytes"] > 0
+    for name in ("unet", "vae", "text_encoder", "safety_checker"):
+        module = getattr(loaded, name)
+        assert not any(param.is_meta for param in module.parameters()), name
+        assert_same_weights(getattr(pipe, name), module)
+    assert loaded.tokenizer is None
+
+
+def test_incomplete_snapshot_names_missing_weights(pipe):
+    snapshots.save_snapshot(pipe, MODEL_ID, torch.float32)
+    manifest = snapshots.read_manifest(MODEL_ID, torch.float32)
+    tensors = manifest["components"]["unet"]["weights"][0]["tensors"]
+    del tensors["conv_out.weight"]
+
+    with pytest.raises(ValueError, match="conv_out.weight"):
+        snapshots.load_snapshot(manifest, torch.float32, "cpu")
+
+
+def test_unloadable_snapshot_falls_back_to_hub_once(pipe, monkeypatch):
+    snapshots.save_snapshot(pipe, MODEL_ID, torch.float32)
+    manifest_path = os.path.join(
+        snapshots.snapshot_dir(MODEL_ID, torch.float32), snapshots.MANIFEST_NAME
+    )
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["components"]["unet"]["class"] = "MissingClass"
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    hub_loads = []
+
+    def from_pretrained(model_id, **kwargs):
+        hub_loads.append(model_id)
+        return pipe
+
+    monkeypatch.setattr(
+        snapshots.AutoPipelineForText2Image, "from_pretrained", from_pretrained
+    )
+
+    _, report = snapshots.load_pipeline(MODEL_ID, torch.float32, "cpu")
+
+    assert report["source"] == "hub"
+    assert hub_loads == [MODEL_ID]
+    # Discarded, and not written again by this process.
+    assert snapshots.read_manifest(MODEL_ID, torch.float32) is None
+
+
+def test_save_keeps_snapshot_of_race_winner(pipe, monkeypatch):
+    snapshots.save_snapshot(pipe, MODEL_ID, torch.float32)
+    target = snapshots.snapshot_dir(MODEL_ID, torch.float32)
+    manifest_inode = os.stat(os.path.join(target, snapshots.MANIFEST_NAME)).st_ino
+    read_manifest = snapshots.read_manifest
+    calls = []
+
+    def stale_first_read(*args):
+        # The losing worker saw no snapshot when it started saving.
+        calls.append(args)
+        return None if len(calls) == 1 else read_manifest(*args)
+
+    monkeypatch.setattr(snapshots, "read_manifest", stale_first_read)
+
+    snapshots.save_snapshot(pipe, MODEL_ID, torch.float32)
+
+    assert os.stat(os.path.join(target, snapshots.MANIFEST_NAME)).st_ino == (
+        manifest_inode
+    )
+    assert os.listdir(os.path.dirname(target)) == ["float32"]